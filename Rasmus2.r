@@ -16,9 +16,11 @@ outputfil=paste(outputdir, filnavn, sep="/")
 
 rot=matrix(scan(inputfil),,4,byrow=T)
 starttime=Sys.time()
-StartNew(outputfil, rot)
+res=StartNew(outputfil, rot)
+print(as.vector(res))
 stoptime=Sys.time()
 difftime(stoptime, starttime, units="secs")
+print(attr(res, "timing"))
 
 
 # Produces in labud:
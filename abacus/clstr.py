@@ -4,12 +4,17 @@
 #
 # Time-stamp: <2017-02-02 20:05:02 yuki>
 #
-# Description: Run cluster analysis on Abacus. Step no's are obtained
-#  from $SLURM_JOB_NAME, which should be in the form {name}.start.end
-#  or {name}-group#-#ofgroups. To overwrite existing summary.pkl
-#  files, start $SLURM_JOB_NAME with 'rp'. Default is to skip the
-#  step if summary.pkl file exists.
-#  Change minn parameter as required.
+# Description: Run cluster analysis on Abacus, or on this machine
+#  with --executor local. Step no's are given by --steps or --group,
+#  or otherwise obtained from $SLURM_JOB_NAME, which should be in the
+#  form {name}.start.end or {name}-group#-#ofgroups. To overwrite
+#  existing summary.pkl files, use --overwrite or start
+#  $SLURM_JOB_NAME with 'rp'. Default is to skip the step if
+#  summary.pkl file exists, unless incr.py has added proteins to the
+#  step: then only the patterns listed in changed.pkl are clustered,
+#  and the results merged into summary.pkl. The patterns finished by
+#  an earlier, killed run of a step are not clustered again.
+#  Change minn parameter as required, or use --minn.
 #
 # Author: Yuki Koyanagi
 # History:
@@ -20,48 +25,93 @@
 #   improve_modebox script.
 #  2017-02-02: Set default to skip the step if summary.pkl file exits.
 #   Output summary.pkl file are written as the steps are finished.
+#  2026-10-18: engine 'Rpool' keeps one R process per worker (see
+#   rpool.py) instead of starting Rscript for every pattern.
+#  2026-10-18: Improve the mode box in-process with improve_modebox.py
+#   instead of running improve_modebox.pl.
+#  2026-10-18: Set cache_dir to reuse the results for rotations that
+#   have been clustered before (see clustcache.py).
+#  2026-10-18: Only cluster the patterns in changed.pkl, written by
+#   incr.py, if summary.pkl exists.
+#  2026-10-18: Submit batches of about equal estimated cost, largest
+#   first, instead of 384 round-robin chunks (see jobsched.py), and
+#   report the utilisation of the nodes.
+#  2026-10-18: Run the jobs with pp or a local process pool (see
+#   executors.py), chosen by --executor. Steps and paths can be given
+#   as arguments instead of environment variables.
+#  2026-10-18: Record every finished pattern in a journal (see
+#   journal.py), so that a killed job resumes where it stopped.
 #
+import argparse
 import os
 import cPickle as pickle
 import subprocess
-import pp
-from itertools import islice, tee
+import tempfile
+import time
+
+import clustcache
+import improve_modebox
+import jobsched
+import journal
+import rpool
+from executors import executors
 
 stepn = 100
+nsteps = 792
 minn = 1
+engine = 'R'  # or 'Rpool'
+# Directory of the cache of clustering results, shared by all steps
+# and runs (e.g. $WORK/clstrcache), or None for no cache.
+cache_dir = None
+cache_size = 50 * 2**30  # bytes
+# Cores to plan for, if the job server does not know yet
+default_cores = 24*16
 
 
-# Set up servers
-ppservers = open('/tmp/nodelist').read().strip().split()
-ppservers = tuple(pp + ':2048' for pp in ppservers)
-job_server = pp.Server(0, ppservers=ppservers)
-
-
-def chunk(data, n=24*16):
-    '''Splits input data (dict) into n equal chunks.'''
-    it = iter(data)
-    for i, iterator in enumerate(tee(it, n)):
-        yield {k: data[k] for k in islice(iterator, i, None, n)}
-
-
-def runclstrs(data, step):
+def runclstrs(data, step, engine, cache_dir, cache_size, script_dir,
+              scratch, journal_dir=None):
+    cache = None
+    if cache_dir:
+        cache = clustcache.ClusterCache(cache_dir, cache_size)
+    jrnl = None
+    if journal_dir:
+        jrnl = journal.Journal(journal_dir)
     d = {}
+    timings = []
     for pattern in data:
+        hits = cache.hits if cache else 0
         # If R script has error runclstr returns None
-        summ = runclstr(pattern, data[pattern], step)
+        summ, t = jobsched.timed(
+            lambda: runclstr(pattern, data[pattern], step, engine, cache,
+                             script_dir, scratch),
+            len(data[pattern]),
+            lambda: cache is not None and cache.hits > hits)
+        timings.append(t)
+        if jrnl:
+            jrnl.append(pattern, journal.key(data[pattern], engine), summ)
         if summ:
             d[pattern] = summ
-    return step, d
+    if jrnl:
+        jrnl.close()
+    if cache:
+        print 'step{}: {} of {} patterns from cache'.format(
+            step, cache.hits, len(data))
+    return step, d, timings
+
 
+def runclstr(pattern, data, step, engine, cache=None, script_dir='.',
+             scratch=tempfile.gettempdir()):
+    text = clustcache.rotation_text(data)
+    if cache:
+        # Rasmus2.r and cluster_worker.r give the same results.
+        key = cache.key(text, 'R')
+        res = cache.get(key)
+        if res is not None:
+            return res
 
-def runclstr(pattern, data, step):
     # Files and dirs
-    rscript = os.path.join(os.path.expandvars('$SLURM_SUBMIT_DIR'),
-                           'Rasmus2.r')
-    imprv = os.path.join(os.path.expandvars('$SLURM_SUBMIT_DIR'),
-                         'improve_modebox.pl')
-    stepd = os.path.join(os.path.expandvars('$LOCALSCRATCH'),
-                         'step{}'.format(step))
+    rscript = os.path.join(script_dir, 'Rasmus2.r')
+    stepd = os.path.join(scratch, 'step{}'.format(step))
     rotf = os.path.join(stepd, pattern)
 
     if not os.path.exists(stepd):
@@ -72,88 +122,218 @@ def runclstr(pattern, data, step):
             pass
 
     with open(rotf, 'w') as f:
-        f.write('\n'.join(['\t'.join(d) for d in data]))
+        f.write(text)
 
-    try:
-        subprocess.check_output(['Rscript', rscript, rotf],
-                                stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as cpe:
-        print 'Error while processing step{}/{}'.format(step, pattern)
-        print cpe.output
-        return None
+    if engine == 'Rpool':
+        try:
+            rpool.shared_worker(os.path.dirname(rscript)).cluster(rotf, data)
+        except rpool.RWorkerError as e:
+            print 'Error while processing step{}/{}'.format(step, pattern)
+            print e.log
+            return None
+    else:
+        try:
+            subprocess.check_output(['Rscript', rscript, rotf],
+                                    stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as cpe:
+            print 'Error while processing step{}/{}'.format(step, pattern)
+            print cpe.output
+            return None
 
     # sumf = rotf + '_Summary.txt'
 
-    cmd = ' '.join([imprv, rotf])
-    os.system(cmd)
+    improve_modebox.improve_modebox(rotf)
 
     sumf = rotf + '_Summary2.txt'
 
     with open(sumf) as f:
         res = f.read()
 
+    if cache:
+        cache.put(key, res)
     return res
 
 
-# Parse jobname to get start and end step no's
-jobname = os.path.expandvars('$SLURM_JOB_NAME')
-if '.' in jobname:
-    _, startstep, endstep = jobname.split('.')
-    steps = range(int(startstep), int(endstep)+1)
-elif '-' in jobname:
-    _, grp, total = jobname.split('-')
-    steps = range(int(grp), 792, int(total))
-else:
-    raise SyntaxError('SLURM_JOB_NAME not set correctly.')
-
-overwrite = jobname.startswith('rp')
-
-cdpdir = os.path.join(os.path.expandvars('$WORK'), 'cdp')
-
-# Submit jobs to server
-clsts = []
-submitted = []
-
-for step in steps:
-    # Load the rotation data
-    workdir = os.path.join(cdpdir,
-                           'step{}'.format(step),
-                           'n{}'.format(minn))
-    if (
-            (not overwrite) and
-            os.path.exists(os.path.join(workdir, 'summary.pkl'))):
-        print 'Skipping step{}. Summary.pkl file exists.'.format(step)
-        continue
-
-    rotfile = os.path.join(workdir, 'rotations.pkl')
-    with open(rotfile, 'rb') as r:
-        rotations = pickle.load(r)
-
-    # Submit jobs for subset of data to avoid too many threads
-    for subset in chunk(rotations):
-        clstr = job_server.submit(runclstrs,
-                                  (subset, step),
-                                  (runclstr,),
-                                  ('os', 'subprocess'),
-                                  None,
-                                  (),
-                                  'step{}'.format(step))
-        clsts.append(clstr)
-    submitted.append(step)
-
-# Get the results in dict; {pattern: content}
-for step in submitted:
-    job_server.wait('step{}'.format(step))
-    summary = {}
-    for clst in [task for task in clsts
-                 if task.group == 'step{}'.format(step)]:
-        step, d = clst()
-        summary.update(d)
-    outf = os.path.join(cdpdir,
-                        'step{}'.format(step),
-                        'n{}'.format(minn),
-                        'summary.pkl')
-    with open(outf, 'wb') as o:
-        pickle.dump(summary, o)
-
-# job_server.destroy()
+def jobname_steps(jobname):
+    '''Parse jobname to get start and end step no's'''
+    if '.' in jobname:
+        _, startstep, endstep = jobname.split('.')
+        return range(int(startstep), int(endstep)+1)
+    elif '-' in jobname:
+        _, grp, total = jobname.split('-')
+        return range(int(grp), nsteps, int(total))
+    else:
+        raise SyntaxError('SLURM_JOB_NAME not set correctly.')
+
+
+def main(executor, steps, cdpdir, script_dir, scratch, overwrite=False,
+         minn=minn, engine=engine, cache_dir=cache_dir,
+         cache_size=cache_size):
+    # Clustering times of earlier runs, for the cost model
+    timings_file = os.path.join(cdpdir, 'clstr_timings.txt')
+    model = jobsched.CostModel.from_file(timings_file)
+    print 'Cost model: {}'.format(model)
+
+    # Submit jobs to server
+    start = time.time()
+    clsts = []
+    submitted = []
+    # {step: (summary, changed patterns)} of the steps updated by incr.py
+    previous = {}
+    # {step: {pattern: result}} finished by an earlier run
+    resumed = {}
+
+    for step in steps:
+        # Load the rotation data
+        workdir = os.path.join(cdpdir,
+                               'step{}'.format(step),
+                               'n{}'.format(minn))
+        sumfile = os.path.join(workdir, 'summary.pkl')
+        changesfile = os.path.join(workdir, 'changed.pkl')
+        incremental = (not overwrite) and os.path.exists(sumfile) and \
+            os.path.exists(changesfile)
+        if (
+                (not overwrite) and (not incremental) and
+                os.path.exists(sumfile)):
+            print 'Skipping step{}. Summary.pkl file exists.'.format(step)
+            continue
+
+        rotfile = os.path.join(workdir, 'rotations.pkl')
+        with open(rotfile, 'rb') as r:
+            rotations = pickle.load(r)
+
+        if incremental:
+            with open(sumfile, 'rb') as s:
+                summary = pickle.load(s)
+            with open(changesfile, 'rb') as c:
+                changed = pickle.load(c)
+            previous[step] = summary, changed
+            rotations = {k: rotations[k] for k in changed if k in rotations}
+            print 'step{}: clustering {} changed patterns'.format(
+                step, len(rotations))
+
+        # Skip the patterns in the journal of a killed run, if their
+        # rotations are still the same
+        done = journal.load(os.path.join(workdir, 'journal'))
+        resumed[step] = {}
+        for k, (key, res) in done.iteritems():
+            if k in rotations and key == journal.key(rotations[k], engine):
+                resumed[step][k] = res
+                del rotations[k]
+        if resumed[step]:
+            print 'step{}: {} patterns done by an earlier run'.format(
+                step, len(resumed[step]))
+
+        # Submit batches of patterns, largest first, to avoid too many
+        # threads. Idle workers take the next batch, so the small ones
+        # fill up the end.
+        cores = sum(executor.nodes().values()) or default_cores
+        for cost, subset in jobsched.plan(rotations, model, cores):
+            clstr = executor.submit(runclstrs,
+                                    (subset, step, engine, cache_dir,
+                                     cache_size, script_dir, scratch,
+                                     os.path.join(workdir, 'journal')),
+                                    'step{}'.format(step),
+                                    (runclstr,),
+                                    ('os', 'subprocess', 'tempfile',
+                                     'rpool',
+                                     'improve_modebox', 'clustcache',
+                                     'jobsched', 'journal'))
+            clsts.append(clstr)
+        submitted.append(step)
+
+    # Get the results in dict; {pattern: content}
+    timings = []
+    for step in submitted:
+        executor.wait('step{}'.format(step))
+        summary = {}
+        if step in previous:
+            summary, changed = previous[step]
+            # A pattern failing now has no entry, as in a full run
+            for k in changed:
+                summary.pop(k, None)
+        for k, res in resumed[step].iteritems():
+            if res:
+                summary[k] = res
+        for clst in [task for task in clsts
+                     if task.group == 'step{}'.format(step)]:
+            step, d, t = clst()
+            summary.update(d)
+            timings.extend(t)
+        workdir = os.path.join(cdpdir,
+                               'step{}'.format(step),
+                               'n{}'.format(minn))
+        outf = os.path.join(workdir, 'summary.pkl')
+        with open(outf + '.tmp', 'wb') as o:
+            pickle.dump(summary, o)
+        os.rename(outf + '.tmp', outf)
+        # The journal is compacted into summary.pkl now
+        journal.remove(os.path.join(workdir, 'journal'))
+        changesfile = os.path.join(workdir, 'changed.pkl')
+        if os.path.exists(changesfile):
+            os.remove(changesfile)
+
+    jobsched.record(timings_file, timings)
+    for line in jobsched.report(timings, executor.nodes(),
+                                start, time.time()):
+        print line
+    executor.print_stats()
+
+
+if __name__ == '__main__':
+    env = os.environ.get
+    parser = argparse.ArgumentParser(
+        description='Run the cluster analysis of the steps.')
+    parser.add_argument('--executor', choices=sorted(executors),
+                        default='pp', help='Run the jobs on the pp '
+                        'servers in --nodelist (default) or in a local '
+                        'process pool')
+    parser.add_argument('--ncpus', type=int,
+                        help='Processes of the local executor '
+                        '(default: all cores)')
+    parser.add_argument('--nodelist', default='/tmp/nodelist',
+                        help='Nodes running ppserver.py')
+    parser.add_argument('--steps', type=int, nargs=2,
+                        metavar=('START', 'END'),
+                        help='Run steps START to END, inclusive')
+    parser.add_argument('--group', type=int, nargs=2,
+                        metavar=('GROUP', 'GROUPS'),
+                        help='Run every GROUPS\'th step, starting '
+                        'with GROUP')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Overwrite existing summary.pkl files')
+    parser.add_argument('--cdpdir',
+                        default=os.path.join(env('WORK', '.'), 'cdp'),
+                        help='Directory of the steps (default: $WORK/cdp)')
+    parser.add_argument('--script-dir',
+                        default=env('SLURM_SUBMIT_DIR', os.getcwd()),
+                        help='Directory of Rasmus2.r (default: '
+                        '$SLURM_SUBMIT_DIR)')
+    parser.add_argument('--scratch',
+                        default=env('LOCALSCRATCH', tempfile.gettempdir()),
+                        help='Directory for the rotation files (default: '
+                        '$LOCALSCRATCH)')
+    parser.add_argument('--minn', type=int, default=minn)
+    parser.add_argument('--engine', choices=('R', 'Rpool'),
+                        default=engine)
+    parser.add_argument('--cache-dir', default=cache_dir)
+    args = parser.parse_args()
+
+    jobname = env('SLURM_JOB_NAME', '')
+    if args.steps:
+        steps = range(args.steps[0], args.steps[1]+1)
+    elif args.group:
+        steps = range(args.group[0], nsteps, args.group[1])
+    else:
+        steps = jobname_steps(jobname)
+    overwrite = args.overwrite or jobname.startswith('rp')
+
+    if args.executor == 'local':
+        executor = executors['local'](args.ncpus)
+    else:
+        executor = executors['pp'](args.nodelist)
+    try:
+        main(executor, steps, args.cdpdir, args.script_dir, args.scratch,
+             overwrite, args.minn, args.engine, args.cache_dir, cache_size)
+    finally:
+        executor.close()
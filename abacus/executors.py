@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# File: executors.py
+#
+# Time-stamp: <>
+#
+# Description: Where clstr.py runs its jobs. PPExecutor submits them
+#  to Parallel Python servers (started by srun ppserver.py in
+#  clstrab.sh, on the nodes listed in /tmp/nodelist); LocalExecutor
+#  runs them in a multiprocessing pool on this machine, e.g. to run
+#  or profile the clustering on a workstation. Both take jobs in
+#  groups, as pp.Server does, and a submitted job is called to get
+#  its result.
+#
+# History:
+#  2026-10-18: Created
+#
+
+import multiprocessing
+import socket
+from collections import defaultdict
+
+
+class LocalJob:
+    def __init__(self, result, group):
+        self.result = result
+        self.group = group
+
+    def __call__(self):
+        return self.result.get()
+
+
+class LocalExecutor:
+    """A pool of ncpus processes (default: all cores)."""
+
+    def __init__(self, ncpus=None):
+        self.ncpus = ncpus or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.ncpus)
+        self.jobs = defaultdict(list)
+
+    def submit(self, func, args, group, depfuncs=(), modules=()):
+        """Run func(*args). depfuncs and modules are only needed by
+        pp; here func must be a module level function."""
+        job = LocalJob(self.pool.apply_async(func, args), group)
+        self.jobs[group].append(job)
+        return job
+
+    def wait(self, group):
+        for job in self.jobs[group]:
+            job.result.wait()
+
+    def nodes(self):
+        """{node: no. of cores}"""
+        return {socket.gethostname(): self.ncpus}
+
+    def print_stats(self):
+        print 'Ran {} jobs in {} processes on {}'.format(
+            sum(len(j) for j in self.jobs.itervalues()), self.ncpus,
+            socket.gethostname())
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+class PPExecutor:
+    """Parallel Python servers on the nodes in nodelist."""
+
+    def __init__(self, nodelist='/tmp/nodelist', port=2048):
+        import pp
+        ppservers = open(nodelist).read().strip().split()
+        ppservers = tuple('{}:{}'.format(s, port) for s in ppservers)
+        self.server = pp.Server(0, ppservers=ppservers)
+
+    def submit(self, func, args, group, depfuncs=(), modules=()):
+        return self.server.submit(func, args, depfuncs, modules, None, (),
+                                  group)
+
+    def wait(self, group):
+        self.server.wait(group)
+
+    def nodes(self):
+        return self.server.get_active_nodes()
+
+    def print_stats(self):
+        self.server.print_stats()
+
+    def close(self):
+        # The remote ppservers time out when we are gone (see
+        # clstrab.sh).
+        pass
+
+
+executors = {'local': LocalExecutor, 'pp': PPExecutor}
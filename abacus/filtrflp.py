@@ -9,43 +9,24 @@
 #
 # Author: Yuki Koyanagi
 # History:
+#  2026-10-18: Use filter_bonds.filter_multi, which filters for
+#   several cutoffs (comma separated in the job name) in one go.
 #
 
-import collections
 import os
 
-bond_col = 6  # Bond description is 7th column in the input file
-res_col = 7  # Residue description is 8th column in the input file
-
-
-def filter(source, dest, minimum):
-    # Read bonds
-    bonds = collections.Counter()
-    with open(source) as f:
-        for line in f:
-            cols = line.split('\t')
-            bond = '{b}_{r}'.format(
-                b=cols[bond_col].strip(),
-                r=cols[res_col].strip())
-            bonds[bond] += 1
-
-    # If count greater than specified, copy to output
-    with open(source) as s, open(dest, 'w') as d:
-        for line in s:
-            cols = line.split('\t')
-            bond = '{b}_{r}'.format(
-                b=cols[bond_col].strip(),
-                r=cols[res_col].strip())
-            if bonds.get(bond) >= minimum:
-                d.write(line)
+from filter_bonds import filter_multi
 
 
 if __name__ == '__main__':
-    cutoff = 4  # Bond pattern must have freq. >= this number
+    # Bond pattern must have freq. >= cutoff. Several cutoffs can be
+    # given, separated by commas, e.g. {name}-1,4,15,30; they are
+    # filtered in one go.
+    cutoffs = [4]
     jobname = os.path.expandvars('$SLURM_JOB_NAME')
     if len(jobname.split('-')) > 1:
         try:
-            cutoff = int(jobname.split('-')[-1])
+            cutoffs = [int(c) for c in jobname.split('-')[-1].split(',')]
         except ValueError:
             # jobname contains '-', but the last part is not int
             pass
@@ -58,8 +39,10 @@ if __name__ == '__main__':
              for i in range(33)]
     for step in steps:
         stepdir = os.path.join(cdpdir, 'step{}'.format(step))
-        outdir = os.path.join(stepdir, 'n{}'.format(cutoff))
-        os.mkdir(outdir)
-        outf = os.path.join(outdir, 'filtered.txt')
+        dests = []
+        for cutoff in cutoffs:
+            outdir = os.path.join(stepdir, 'n{}'.format(cutoff))
+            os.mkdir(outdir)
+            dests.append((cutoff, os.path.join(outdir, 'filtered.txt')))
         sf = os.path.join(stepdir, flpfn)
-        filter(sf, outf, cutoff)
+        filter_multi(sf, dests)
@@ -9,36 +9,56 @@
 #
 # Author: Yuki Koyanagi
 # History:
+#  2026-10-18: Describe all steps of a process in a single pass over
+#   the protein files (find_local_patterns.py --opts-file).
+#  2026-10-18: Call find_local_patterns in-process instead of
+#   spawning python for every batch of 200 files.
+#  2026-10-18: Describe the proteins in order of name, so that flp.txt
+#   does not depend on the order of os.listdir (see incr.py).
 #
 
 import os
 
+import find_local_patterns
+
+
+def protein_files(protdir):
+    '''The protein files in protdir, in order of protein name.'''
+    return [os.path.join(protdir, f) for f in
+            sorted(os.listdir(protdir), key=lambda f: os.path.splitext(f)[0])]
+
 
 def main(cdpdir, protdir, optsf, outdir):
     '''Write output from find_local_pattern using optsf'''
     params = parseopt(optsf)
-    fs = [os.path.join(protdir, f) for f in os.listdir(protdir)]
+    fs = protein_files(protdir)
 
-    flist = [fs[i:i+200] for i in xrange(0, len(fs), 200)]
+    config = find_local_patterns.PatternConfig(
+        window_size=int(params['window-size']),
+        nearby_remotes=int(params['nearby-remotes']),
+        nearby_twists=int(params['nearby-twists']),
+        residue_scheme=int(params['residue-scheme']),
+        always_include_remotes=True,
+        show_residues=True)
     flp_out = os.path.join(outdir, 'flp.txt')
+    with open(flp_out, 'a') as o:
+        find_local_patterns.write_patterns(fs, config, o)
+
+
+def main_multi(cdpdir, protdir, optsfs):
+    '''Write output from find_local_pattern for all optsfs at once.
+    The output for stepN_opts goes to cdpdir/stepN/flp.txt'''
+    fs = protein_files(protdir)
 
-    for s in flist:
-        files = ' '.join(s)
-        cmd = ('python find_local_patterns.py {f}'
-               ' --window-size {w}'
-               ' --nearby-remotes {r}'
-               ' --nearby-twists {t}'
-               ' --residue-scheme {s}'
-               ' --always-include-remotes'
-               ' --show-residues'
-               ' >> {o}').format(
-                   f=files,
-                   w=str(params['window-size']),
-                   r=str(params['nearby-remotes']),
-                   t=str(params['nearby-twists']),
-                   s=str(params['residue-scheme']),
-                   o=flp_out)
-        os.system(cmd)
+    configs = [find_local_patterns.PatternConfig.from_opts_file(o)
+               for o in optsfs]
+    outs = [find_local_patterns.open_step_output(o, cdpdir)
+            for o in optsfs]
+    try:
+        find_local_patterns.write_multi_patterns(fs, configs, outs)
+    finally:
+        for o in outs:
+            o.close()
 
 
 def parseopt(optsf):
@@ -60,10 +80,6 @@ if __name__ == '__main__':
     # We'll use 3 nodes, so 3*24=72 cores avail.
     steps = [int(os.path.expandvars('$SLURM_PROCID'))+i*72
              for i in range(11)]
-    for step in steps:
-        fname = 'step{}_opts'.format(step)
-        optsf = os.path.join(optsdir, fname)
-        outdir = os.path.join(cdpdir, 'step{}'.format(step))
-        if not os.path.exists(outdir):
-            os.mkdir(outdir)
-        main(cdpdir, protdir, optsf, outdir)
+    optsfs = [os.path.join(optsdir, 'step{}_opts'.format(step))
+              for step in steps]
+    main_multi(cdpdir, protdir, optsfs)
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+#
+# File: incr.py
+#
+# Time-stamp: <>
+#
+# Description: Add new proteins to an existing run on Abacus, without
+#  redoing flp.py, filtrflp.py and rotab.py for all proteins. The new
+#  protein files are put in cdp/newprot. For each step, the patterns
+#  of the new proteins are merged into stepN/flp.txt, the
+#  nN/filtered.txt files are written again from the merged counts and
+#  only the patterns that changed are updated in nN/rotations.pkl. A
+#  pattern changed if it gained rotations, or if the new proteins
+#  brought its bond description up to the cutoff, so that it now
+#  passes the filter. The changed patterns are added to nN/changed.pkl,
+#  and clstr.py then only clusters those, merging the results into
+#  the existing summary.pkl.
+#
+#  The files end up the same as those of a full run with all
+#  proteins, provided flp.txt is in order of protein name, as flp.py
+#  writes it. Step numbers and cutoffs are as in filtrflp.py. Once all
+#  steps are done, the new protein files are moved to cdp/prot (see
+#  incrab.sh).
+#
+# History:
+#  2026-10-18: Created
+#
+
+import cPickle as pickle
+import os
+
+import find_local_patterns
+from filter_bonds import bond_key
+from flp import protein_files
+from rotab import read_rotations
+
+flpfn = 'flp.txt'
+changesfn = 'changed.pkl'
+
+
+def protein(line):
+    return line.split('\t', 1)[0]
+
+
+def desc(line):
+    '''The pattern of line in rotations.pkl'''
+    cols = line.split()
+    return '{}_{}_{}'.format(cols[6], cols[5], cols[7])
+
+
+def merge_flp(old, new):
+    '''Merge the flp lines old and new, both in order of protein name.
+    Yields (line, is_new).'''
+    new = list(new)
+    j = 0
+    last = None
+    for line in old:
+        p = protein(line)
+        if last is not None and p < last:
+            raise ValueError('{} is not in order of protein name; run '
+                             'flp.py again'.format(old.name))
+        last = p
+        while j < len(new) and protein(new[j]) < p:
+            yield new[j], True
+            j += 1
+        if j < len(new) and protein(new[j]) == p:
+            raise ValueError('Protein {} has been added before'.format(p))
+        yield line, False
+    for line in new[j:]:
+        yield line, True
+
+
+def changed_patterns(old_counts, counts, new_descs, cutoff):
+    '''The changes for cutoff, as (keys, descs): keys are the bond
+    descriptions that reached cutoff with the new lines, all of whose
+    patterns are new in filtered.txt, and descs the patterns of new
+    lines of bond descriptions that had reached it before. new_descs
+    maps the bond descriptions of the new lines to their patterns.'''
+    keys = set()
+    descs = set()
+    for key, d in new_descs.iteritems():
+        if counts[key] < cutoff:
+            continue
+        if old_counts.get(key, 0) >= cutoff:
+            descs.update(d)
+        else:
+            keys.add(key)
+    return keys, descs
+
+
+def update_step(stepdir, new_lines, cutoffs, protdirs):
+    '''Add new_lines, the flp output of the new proteins, to stepdir.
+    protdirs are the directories of the old and new protein files.'''
+    flpf = os.path.join(stepdir, flpfn)
+    tmpf = flpf + '.tmp'
+
+    # Merge flp.txt, counting the bond descriptions before and after
+    old_counts = {}
+    counts = {}
+    new_descs = {}
+    with open(flpf) as old, open(tmpf, 'w') as o:
+        for line, is_new in merge_flp(old, new_lines):
+            key = bond_key(line)
+            counts[key] = counts.get(key, 0) + 1
+            if is_new:
+                new_descs.setdefault(key, set()).add(desc(line))
+            else:
+                old_counts[key] = old_counts.get(key, 0) + 1
+            o.write(line)
+
+    changed = dict((cutoff, changed_patterns(old_counts, counts,
+                                             new_descs, cutoff))
+                   for cutoff in cutoffs)
+
+    # Filter the merged lines, collecting those of changed patterns
+    outs = []
+    bonds = dict((cutoff, {}) for cutoff in cutoffs)
+    needed = set()
+    try:
+        for cutoff in cutoffs:
+            fn = os.path.join(stepdir, 'n{}'.format(cutoff), 'filtered.txt')
+            outs.append((cutoff, open(fn + '.tmp', 'w')))
+        with open(tmpf) as f:
+            for line in f:
+                key = bond_key(line)
+                count = counts[key]
+                d = None
+                for cutoff, o in outs:
+                    if count < cutoff:
+                        continue
+                    o.write(line)
+                    keys, c = changed[cutoff]
+                    if d is None:
+                        d = desc(line)
+                    if key in keys or d in c:
+                        cols = line.split()
+                        bonds[cutoff].setdefault(d, []).append(
+                            '{}/{}'.format(cols[0], cols[1]))
+                        needed.add(cols[0])
+    finally:
+        for cutoff, o in outs:
+            o.close()
+
+    prots = {}
+    for protdir in protdirs:
+        read_rotations(protdir, needed, prots)
+
+    for cutoff in cutoffs:
+        filtdir = os.path.join(stepdir, 'n{}'.format(cutoff))
+        rotf = os.path.join(filtdir, 'rotations.pkl')
+        with open(rotf, 'rb') as r:
+            rots = pickle.load(r)
+        for d, lines in bonds[cutoff].iteritems():
+            rots[d] = [prots[s] for s in lines]
+        with open(rotf + '.tmp', 'wb') as o:
+            pickle.dump(rots, o)
+
+        # Patterns changed by earlier updates may not be clustered yet
+        changesf = os.path.join(filtdir, changesfn)
+        pending = set()
+        if os.path.exists(changesf):
+            with open(changesf, 'rb') as r:
+                pending = pickle.load(r)
+        with open(changesf + '.tmp', 'wb') as o:
+            pickle.dump(pending | set(bonds[cutoff]), o)
+
+    for cutoff in cutoffs:
+        filtdir = os.path.join(stepdir, 'n{}'.format(cutoff))
+        for fn in ('filtered.txt', 'rotations.pkl', changesfn):
+            f = os.path.join(filtdir, fn)
+            os.rename(f + '.tmp', f)
+    # flp.txt last, so that an interrupted update can be run again
+    os.rename(tmpf, flpf)
+
+
+def main(cdpdir, protdir, newdir, optsfs, cutoffs):
+    '''Add the proteins in newdir to the steps of optsfs.'''
+    fs = protein_files(newdir)
+    old = set(os.path.splitext(f)[0] for f in os.listdir(protdir))
+    for f in fs:
+        if os.path.splitext(os.path.basename(f))[0] in old:
+            raise ValueError('Protein {} has been added before'.format(f))
+
+    configs = [find_local_patterns.PatternConfig.from_opts_file(o)
+               for o in optsfs]
+    new_lines = [[] for o in optsfs]
+    for texts in find_local_patterns.describe_files(fs, configs, True):
+        for lines, text in zip(new_lines, texts):
+            lines.extend(text.splitlines(True))
+
+    for optsf, lines in zip(optsfs, new_lines):
+        step = os.path.basename(optsf).split('_')[0]
+        update_step(os.path.join(cdpdir, step), lines, cutoffs,
+                    (protdir, newdir))
+
+
+if __name__ == '__main__':
+    # default values
+    cdpdir = os.path.join(os.path.expandvars('$WORK'), 'cdp')
+    protdir = os.path.join(cdpdir, 'prot')
+    newdir = os.path.join(cdpdir, 'newprot')
+    optsdir = os.path.join(cdpdir, 'opts')
+    # As in filtrflp.py, several cutoffs may be given, comma separated
+    cutoffs = [4]
+    jobname = os.path.expandvars('$SLURM_JOB_NAME')
+    if len(jobname.split('-')) > 1:
+        try:
+            cutoffs = [int(c) for c in jobname.split('-')[-1].split(',')]
+        except ValueError:
+            # jobname contains '-', but the last part is not int
+            pass
+
+    # Use 1 node, 24 cores
+    steps = [int(os.path.expandvars('$SLURM_PROCID'))+i*24
+             for i in range(33)]
+    optsfs = [os.path.join(optsdir, 'step{}_opts'.format(step))
+              for step in steps]
+    main(cdpdir, protdir, newdir, optsfs, cutoffs)
@@ -0,0 +1,33 @@
+#!/usr/bin/env bash
+#
+#SBATCH --account austmathjea_slim      # account
+#SBATCH --nodes 1                 # number of nodes
+#SBATCH --ntasks-per-node 24      # number of MPI tasks per node
+#SBATCH --time 0:30:00            # max time (HH:MM:SS)
+#
+# File: incrab.sh
+#
+# Time-stamp: <>
+#
+# Description: Runs incr.py on Abacus cluster, adding the proteins in
+#  $WORK/cdp/newprot to all steps, and then moves them to
+#  $WORK/cdp/prot. The cutoff values are given by $SLURM_JOB_NAME as
+#  for rotab.sh. Run clstrab.sh afterwards to cluster the changed
+#  patterns.
+#
+# History:
+#
+
+echo Running on "$(hostname)"
+echo Available nodes: "$SLURM_NODELIST"
+echo Slurm_submit_dir: "$SLURM_SUBMIT_DIR"
+echo Start time: "$(date)"
+
+# Load the modules previously used when compiling the application
+module purge
+module load python-intel
+
+# Start in total [nodes]*24 MPI ranks on all available CPU cores
+srun python ./incr.py && mv "$WORK"/cdp/newprot/* "$WORK"/cdp/prot/
+
+echo Stop time: "$(date)"
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# File: jobsched.py
+#
+# Time-stamp: <>
+#
+# Description: Scheduling of the clustering jobs of clstr.py. The
+#  cost of clustering a pattern is estimated from its number of
+#  rotations by a power law, fitted to the timings of earlier runs.
+#  plan() packs the patterns of a step into batches of about equal
+#  cost and orders them largest first; the job server hands each
+#  batch to the next idle worker, so that the big patterns start
+#  first and the small ones fill the gaps at the end. report() gives
+#  the utilisation of each node.
+#
+# History:
+#  2026-10-18: Created
+#
+
+import math
+import os
+import socket
+import time
+from collections import defaultdict, namedtuple
+
+# Timing of one pattern: node, no. of rotations, start and end time
+# (seconds since the epoch) and whether the result came from the
+# cache.
+Timing = namedtuple('Timing', 'host n start end cached')
+
+
+class CostModel:
+    """Estimated seconds to cluster n rotations, a*n**b."""
+
+    def __init__(self, a=1e-3, b=1.5):
+        self.a = a
+        self.b = b
+
+    def cost(self, n):
+        return self.a * max(n, 1) ** self.b
+
+    @staticmethod
+    def fit(timings, min_samples=20):
+        """Least squares fit of log(seconds) on log(n) to timings,
+        (n, seconds) pairs. Returns the default model if there are
+        fewer than min_samples usable timings."""
+        xs = []
+        ys = []
+        for n, t in timings:
+            if n > 0 and t > 0:
+                xs.append(math.log(n))
+                ys.append(math.log(t))
+        if len(xs) < min_samples:
+            return CostModel()
+        mx = sum(xs) / len(xs)
+        my = sum(ys) / len(ys)
+        sxx = sum((x - mx)**2 for x in xs)
+        if sxx == 0:
+            return CostModel()
+        b = sum((x - mx)*(y - my) for x, y in zip(xs, ys)) / sxx
+        return CostModel(math.exp(my - b*mx), b)
+
+    @staticmethod
+    def from_file(fn, min_samples=20):
+        """The model fitted to the timings in fn, as written by
+        record()."""
+        if not os.path.exists(fn):
+            return CostModel()
+        timings = []
+        with open(fn) as f:
+            for line in f:
+                cols = line.split()
+                if len(cols) == 2:
+                    timings.append((int(cols[0]), float(cols[1])))
+        return CostModel.fit(timings, min_samples)
+
+    def __str__(self):
+        return '{:.3g}*n**{:.3g}'.format(self.a, self.b)
+
+
+def plan(data, model, cores, per_core=4):
+    """Split data, {pattern: rotations}, into batches of estimated cost
+    about total/(cores*per_core), largest first. A pattern costing
+    more than that is a batch of its own. Returns a list of (cost,
+    {pattern: rotations})."""
+    costs = sorted(((model.cost(len(rot)), pattern)
+                    for pattern, rot in data.iteritems()), reverse=True)
+    target = sum(c for c, _ in costs) / max(cores * per_core, 1)
+    batches = []
+    cost = 0
+    batch = {}
+    for c, pattern in costs:
+        batch[pattern] = data[pattern]
+        cost += c
+        if cost >= target:
+            batches.append((cost, batch))
+            cost = 0
+            batch = {}
+    if batch:
+        batches.append((cost, batch))
+    return batches
+
+
+def timed(f, n, cached=lambda: False):
+    """Call f(), returning (result, Timing) with n rotations. cached
+    is called afterwards to tell whether the result was cached."""
+    start = time.time()
+    res = f()
+    return res, Timing(socket.gethostname(), n, start, time.time(),
+                       cached())
+
+
+def record(fn, timings):
+    """Append the clustering times (not those from the cache) to fn,
+    for CostModel.from_file."""
+    with open(fn, 'a') as o:
+        for t in timings:
+            if not t.cached:
+                o.write('{}\t{:.3f}\n'.format(t.n, t.end - t.start))
+
+
+def _short(host):
+    return host.split(':')[0].split('.')[0]
+
+
+def report(timings, nodes, start, end):
+    """Lines reporting the utilisation of each node between start and
+    end. nodes is {node: no. of cores}, as from
+    pp.Server.get_active_nodes; nodes missing there are assumed to
+    have 24 cores."""
+    busy = defaultdict(float)
+    jobs = defaultdict(int)
+    for t in timings:
+        busy[t.host] += t.end - t.start
+        jobs[t.host] += 1
+    cores = {}
+    for h, c in nodes.iteritems():
+        if h == 'local':
+            h = socket.gethostname()
+        h = _short(h)
+        cores[h] = max(c, cores.get(h, 0))
+    wall = max(end - start, 1e-9)
+    lines = []
+    total_cores = 0
+    for host in sorted(busy):
+        c = cores.get(_short(host)) or 24
+        total_cores += c
+        lines.append('{}: {} patterns, {:.0f}s busy, {:.1%} of {} cores'
+                     .format(host, jobs[host], busy[host],
+                             busy[host] / (wall * c), c))
+    work = sum(busy.values())
+    if total_cores:
+        lines.append('total: {:.0f}s of work in {:.0f}s on {} cores, '
+                     '{:.1%} utilisation (best possible {:.0f}s)'
+                     .format(work, wall, total_cores,
+                             work / (wall * total_cores),
+                             work / total_cores))
+    return lines
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# File: journal.py
+#
+# Time-stamp: <>
+#
+# Description: Journal of the patterns clustered in a step, so that a
+#  job that is killed (walltime, node failure) can be resumed without
+#  clustering the finished patterns again. Every worker process
+#  appends to a file of its own in the journal directory (stepN/nM/
+#  journal), so no locking is needed, also across nodes. A record
+#  holds the pattern, the key of its rotations (see clustcache.py)
+#  and the result, and is written with its length and CRC-32 and
+#  synced to disk before the next pattern is started; a record cut
+#  off by a crash is ignored when reading. A result is only used
+#  again if the key matches, i.e. the rotations of the pattern are
+#  the same as when it was clustered.
+#
+# History:
+#  2026-10-18: Created
+#
+
+import cPickle as pickle
+import errno
+import os
+import shutil
+import socket
+import struct
+import zlib
+
+import clustcache
+
+header = struct.Struct('<II')  # length and CRC-32 of the record
+
+
+def key(rot, engine):
+    """The key of the rotations rot, clustered by engine."""
+    return clustcache.ClusterCache.key(clustcache.rotation_text(rot), engine)
+
+
+class Journal:
+    """The journal file of this process in journal_dir."""
+
+    def __init__(self, journal_dir):
+        try:
+            os.makedirs(journal_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fn = '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.f = open(os.path.join(journal_dir, fn), 'ab')
+
+    def append(self, pattern, key, res):
+        """Record res (None for a failed pattern) for pattern."""
+        data = pickle.dumps((pattern, key, res), pickle.HIGHEST_PROTOCOL)
+        self.f.write(header.pack(len(data), zlib.crc32(data) & 0xffffffff))
+        self.f.write(data)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read(fn):
+    """Yield the records (pattern, key, res) in journal file fn, up to
+    the first incomplete or damaged one."""
+    with open(fn, 'rb') as f:
+        while True:
+            h = f.read(header.size)
+            if len(h) < header.size:
+                return
+            n, crc = header.unpack(h)
+            data = f.read(n)
+            if len(data) < n or zlib.crc32(data) & 0xffffffff != crc:
+                return
+            yield pickle.loads(data)
+
+
+def load(journal_dir):
+    """{pattern: (key, res)} of all records in journal_dir; empty if
+    there is no journal."""
+    done = {}
+    if not os.path.isdir(journal_dir):
+        return done
+    for fn in sorted(os.listdir(journal_dir)):
+        for pattern, k, res in read(os.path.join(journal_dir, fn)):
+            done[pattern] = k, res
+    return done
+
+
+def remove(journal_dir):
+    shutil.rmtree(journal_dir, ignore_errors=True)
@@ -9,6 +9,9 @@
 #
 # Author: Yuki Koyanagi
 # History:
+#  2026-10-18: Accept several comma separated cutoffs in the job name,
+#   as filtrflp.py does.
+#  2026-10-18: read_rotations, also used by incr.py.
 #
 
 import cPickle as pickle
@@ -16,6 +19,27 @@ import os
 import shutil
 
 
+def read_rotations(protdir, proteins=None, prots=None):
+    '''Load protein files in protdir into dict {protein/l_num: rot}.
+    If proteins is given, only the proteins named in it are read. The
+    rotations are added to prots, if given.'''
+    # Assumes rotation vectors are in cols 16-19
+    if prots is None:
+        prots = {}
+    for protf in os.listdir(protdir):
+        protn = os.path.splitext(protf)[0]
+        if proteins is not None and protn not in proteins:
+            continue
+        with open(os.path.join(protdir, protf)) as f:
+            for i, line in enumerate(f):
+                lnum = i+1
+                cols = line.split()
+                rot = (cols[15], cols[16], cols[17], cols[18])
+                protln = '{}/{}'.format(protn, lnum)
+                prots[protln] = rot
+    return prots
+
+
 def main(infile, outfile, protdir):
     # Build list of bonds from input file
     bonds = []
@@ -29,18 +53,7 @@ def main(infile, outfile, protdir):
             residue = cols[7]
             bonds.append((protein, l_num, dist, pattern, residue))
 
-    # Load protein files in protdir into dict {protein/l_num: rot}
-    # Assumes rotation vectors are in cols 16-19
-    prots = {}
-    for protf in os.listdir(protdir):
-        with open(os.path.join(protdir, protf)) as f:
-            protn = os.path.splitext(protf)[0]
-            for i, line in enumerate(f):
-                lnum = i+1
-                cols = line.split()
-                rot = (cols[15], cols[16], cols[17], cols[18])
-                protln = '{}/{}'.format(protn, lnum)
-                prots[protln] = rot
+    prots = read_rotations(protdir)
 
     # Create rotation dict {pattern: list of rotations}
     rots = {}
@@ -61,11 +74,12 @@ if __name__ == '__main__':
     cdpdir = os.path.join(os.path.expandvars('$WORK'), 'cdp')
     protdir = os.path.join(cdpdir, 'prot')
     filtf = 'filtered.txt'
-    cutoff = 4
+    # As in filtrflp.py, several cutoffs may be given, comma separated
+    cutoffs = [4]
     jobname = os.path.expandvars('$SLURM_JOB_NAME')
     if len(jobname.split('-')) > 1:
         try:
-            cutoff = int(jobname.split('-')[-1])
+            cutoffs = [int(c) for c in jobname.split('-')[-1].split(',')]
         except ValueError:
             # jobname contains '-', but the last part is not int
             pass
@@ -79,11 +93,12 @@ if __name__ == '__main__':
     steps = [int(os.path.expandvars('$SLURM_PROCID'))+i*24
              for i in range(33)]
     for step in steps:
-        filtdir = os.path.join(cdpdir,
-                               'step{}'.format(step),
-                               'n{}'.format(cutoff))
-        inf = os.path.join(filtdir, filtf)
-        shutil.copy(inf, dstdir)
-        locinf = os.path.join(dstdir, filtf)
-        outf = os.path.join(filtdir, 'rotations.pkl')
-        main(locinf, outf, dstprot)
+        for cutoff in cutoffs:
+            filtdir = os.path.join(cdpdir,
+                                   'step{}'.format(step),
+                                   'n{}'.format(cutoff))
+            inf = os.path.join(filtdir, filtf)
+            shutil.copy(inf, dstdir)
+            locinf = os.path.join(dstdir, filtf)
+            outf = os.path.join(filtdir, 'rotations.pkl')
+            main(locinf, outf, dstprot)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+#
+# File: assessstore.py
+#
+# Time-stamp: <>
+#
+# usage: assessstore.py [-h] assess_dir store
+#
+# Compiles the stepN_assess files written by evaluate_clustering.pl
+# into an SQLite database, indexed by step and pattern
+# (pattern_length_residues), holding for each assessed pattern the
+# columns of the assess file, the cluster size (no. of observations
+# of the primary cluster), the assessment, the SO(3) matrix of the
+# mode box with the magic rotation undone and the guess as printed by
+# predict_rotation, along with the variable settings ('# @' lines) and
+# the highest quality of each step. AssessStore looks them up;
+# AssessDir reads an assess directory directly, with the same
+# interface. open_assessments returns either one.
+#
+# positional arguments:
+#   assess_dir  Directory of stepN_assess files
+#   store       SQLite file to create
+#
+# optional arguments:
+#   -h, --help  show this help message and exit
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: Record the highest quality of each step
+#
+
+import argparse
+import collections
+import os
+import re
+import sqlite3
+import sys
+
+import numpy as np
+
+import so3
+from improve_modebox import idx_to_coord
+
+# center is the unrotated mode box as printed in the assess file, stats
+# the remaining columns, clustersize the no. of observations of the
+# primary cluster, verdict the text of the 'Assessment:' line, source
+# the name in the 'Processing' line, so3 the matrix of the mode box and
+# ev the guess as an Euler vector, as printed by predict_rotation.
+Assessment = collections.namedtuple(
+    'Assessment', 'step pattern length mode center quality stats '
+    'clustersize verdict source so3 ev')
+
+
+def perl_f(x):
+    """x formatted as by Perl's sprintf('%f')"""
+    if np.isnan(x):
+        return 'NaN'
+    if np.isinf(x):
+        return 'Inf' if x > 0 else '-Inf'
+    return '%f' % x
+
+
+def mode_matrices(modes):
+    """The SO(3) matrices of the mode boxes 'bx,by,bz', with the magic
+    rotation undone."""
+    v = idx_to_coord(np.array([m.split(',') for m in modes], dtype=np.int64))
+    n = so3.norm(v)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        axis = np.where(n[:, None] != 0, v/n[:, None], v)
+    return so3.undo_magic_rotation(so3.axis_angle_to_matrix(axis, n, False))
+
+
+def matrix_to_ev(m):
+    """SO3_to_EV of predict_rotation: the axis times 2 sin(angle),
+    except close to pi, as strings 'x,y,z'."""
+    t = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    angle = so3.acos_real((t - 1)/2)
+    s = np.sin(angle)
+    v = np.stack((m[:, 2, 1] - m[:, 1, 2], m[:, 0, 2] - m[:, 2, 0],
+                  m[:, 1, 0] - m[:, 0, 1]), axis=-1)
+    n = so3.norm(v)
+    for d in np.abs(n - 2*s)[(angle != 0) & (s > 0.0001)]:
+        if d > 0.001:
+            sys.stderr.write('Unexpected large diff (%f) between |v| and '
+                             '2sin(angle)\n' % d)
+    # Angle close to pi
+    with np.errstate(invalid='ignore'):
+        b = np.sqrt(np.stack([(m[:, i, i] + 1)*.5 for i in xrange(3)],
+                             axis=-1))
+    x, y, z = b[:, 0], b[:, 1], b[:, 2]
+    y = np.where((x > 0) & (m[:, 0, 1] < 0), -y, y)
+    z = np.where(((x > 0) & (m[:, 0, 2] < 0)) |
+                 (~(x > 0) & (m[:, 1, 2] < 0)), -z, z)
+    near_pi = np.stack((x, y, z), axis=-1)
+    normal = ((angle != 0) & (s > 0.0001))[:, None]
+    ev = np.where(normal, v, np.where(((angle != 0) & (t < 0))[:, None],
+                                      near_pi, 0.0))
+    return [','.join(perl_f(c) for c in e) for e in ev]
+
+
+def read_assess_dir(d):
+    """{step: path} of the stepN_assess files in d."""
+    files = {}
+    for f in os.listdir(d):
+        m = re.search(r'step([0-9]+)_assess', f)
+        if m:
+            files[int(m.group(1))] = os.path.join(d, f)
+    if sorted(files) != range(len(files)):
+        raise ValueError('non-contiguous step numbers!')
+    return files
+
+
+def parse_assess_file(fn, step, rotations=True):
+    """Returns (settings, assessments) of the assess file fn of step:
+    the variable settings as (name, value) pairs and the Assessments,
+    both in the order of the file. so3 and ev are None unless
+    rotations."""
+    with open(fn) as f:
+        lines = f.read().splitlines()
+    settings = []
+    records = []
+    seen = set()
+    clustersize = verdict = source = None
+    for i, line in enumerate(lines):
+        if line.startswith('# @ '):
+            nv = line[len('# @ '):].split(None, 1)
+            if nv:
+                settings.append((nv[0], nv[1] if len(nv) > 1 else ''))
+        elif line.startswith('# Processing '):
+            source = line[len('# Processing '):]
+            # The primary cluster is 5 lines down: pattern, total
+            # observations, #clusters, heading, cluster.
+            cols = lines[i + 5].split() if i + 5 < len(lines) else []
+            clustersize = cols[2] if len(cols) > 2 else None
+            verdict = None
+        elif line.startswith('# Assessment: '):
+            verdict = line[len('# Assessment: '):]
+        elif line.startswith('#') or not line.strip():
+            continue
+        else:
+            cols = line.split()
+            if cols[0] in seen:
+                raise ValueError('key {} already exists at step {}'.format(
+                    cols[0], step))
+            seen.add(cols[0])
+            records.append(Assessment(step, cols[0], cols[1], cols[2],
+                                      cols[3], float(cols[4]),
+                                      '\t'.join(cols[5:]), clustersize,
+                                      verdict, source, None, None))
+    if rotations and records:
+        mats = mode_matrices([r.mode for r in records])
+        evs = matrix_to_ev(mats)
+        records = [r._replace(so3=m, ev=ev)
+                   for r, m, ev in zip(records, mats, evs)]
+    return settings, records
+
+
+class AssessDir:
+    """The assessments in the stepN_assess files of directory d. A
+    file is parsed when one of its steps is first looked up, and kept.
+    so3 and ev are only set if rotations."""
+
+    def __init__(self, d, rotations=False):
+        self.files = read_assess_dir(d)
+        self.rotations = rotations
+        self.parsed = {}
+
+    def _step(self, step):
+        if step not in self.parsed:
+            settings, records = parse_assess_file(self.files[step], step,
+                                                  self.rotations)
+            self.parsed[step] = (settings,
+                                 collections.OrderedDict((r.pattern, r)
+                                                         for r in records),
+                                 max_quality(records))
+        return self.parsed[step]
+
+    def steps(self):
+        return sorted(self.files)
+
+    def settings(self, step):
+        """The variable settings of step as (name, value) pairs."""
+        return self._step(step)[0]
+
+    def table(self, step):
+        """{pattern: Assessment} of step, in the order of the file."""
+        return self._step(step)[1]
+
+    def get(self, step, pattern):
+        """The Assessment of pattern at step, or None."""
+        if step not in self.files:
+            return None
+        return self.table(step).get(pattern)
+
+    def options(self, step):
+        """The find_local_patterns options of step, or None."""
+        for name, value in self.settings(step):
+            if name == 'pattern-options':
+                return value
+        return None
+
+    def max_quality(self, step):
+        """The highest quality of the patterns of step, or None if it
+        has none."""
+        return self._step(step)[2]
+
+
+class AssessStore(AssessDir):
+    """The assessments in an SQLite file written by compile_store."""
+
+    def __init__(self, fn):
+        self.db = sqlite3.connect(fn)
+        # Stores compiled before the highest qualities were recorded
+        # have no max_quality column.
+        self.has_max_quality = 'max_quality' in [
+            row[1] for row in self.db.execute('PRAGMA table_info(steps)')]
+
+    def _assessment(self, row):
+        row = list(row)
+        row[10] = np.frombuffer(row[10], dtype=np.float64).reshape((3, 3))
+        return Assessment(*[str(x) if isinstance(x, unicode) else x
+                            for x in row])
+
+    def steps(self):
+        return [s for s, in self.db.execute(
+            'SELECT step FROM steps ORDER BY step')]
+
+    def settings(self, step):
+        return [(str(n), str(v)) for n, v in self.db.execute(
+            'SELECT name, value FROM settings WHERE step = ? ORDER BY pos',
+            (step,))]
+
+    def table(self, step):
+        return collections.OrderedDict(
+            (str(row[1]), self._assessment(row)) for row in self.db.execute(
+                'SELECT {} FROM assess WHERE step = ? ORDER BY pos'.format(
+                    ', '.join(Assessment._fields)), (step,)))
+
+    def max_quality(self, step):
+        if not self.has_max_quality:
+            return self.db.execute(
+                'SELECT MAX(quality) FROM assess WHERE step = ?',
+                (step,)).fetchone()[0]
+        row = self.db.execute('SELECT max_quality FROM steps WHERE step = ?',
+                              (step,)).fetchone()
+        return None if row is None else row[0]
+
+    def get(self, step, pattern):
+        row = self.db.execute(
+            'SELECT {} FROM assess WHERE step = ? AND pattern = ?'.format(
+                ', '.join(Assessment._fields)), (step, pattern)).fetchone()
+        return None if row is None else self._assessment(row)
+
+    def close(self):
+        self.db.close()
+
+
+def max_quality(records):
+    return max(r.quality for r in records) if records else None
+
+
+def open_assessments(path, rotations=False):
+    """An AssessStore if path is a file, otherwise an AssessDir."""
+    if os.path.isfile(path):
+        return AssessStore(path)
+    return AssessDir(path, rotations)
+
+
+def compile_store(assess_dir, fn):
+    """Write the assessments in assess_dir to the SQLite file fn."""
+    if os.path.exists(fn):
+        os.remove(fn)
+    db = sqlite3.connect(fn)
+    db.executescript('''
+        CREATE TABLE steps (step INTEGER PRIMARY KEY, file TEXT,
+                            max_quality REAL);
+        CREATE TABLE settings (step INTEGER, pos INTEGER, name TEXT,
+                               value TEXT, PRIMARY KEY (step, pos));
+        CREATE TABLE assess (step INTEGER, pattern TEXT, pos INTEGER,
+                             length TEXT, mode TEXT, center TEXT,
+                             quality REAL, stats TEXT, clustersize TEXT,
+                             verdict TEXT, source TEXT, so3 BLOB, ev TEXT,
+                             PRIMARY KEY (step, pattern));
+        CREATE INDEX assess_pos ON assess (step, pos);
+        ''')
+    d = AssessDir(assess_dir)
+    for step in d.steps():
+        settings, records = parse_assess_file(d.files[step], step)
+        db.execute('INSERT INTO steps VALUES (?, ?, ?)',
+                   (step, os.path.basename(d.files[step]),
+                    max_quality(records)))
+        db.executemany('INSERT INTO settings VALUES (?, ?, ?, ?)',
+                       [(step, i, n, v) for i, (n, v) in enumerate(settings)])
+        db.executemany(
+            'INSERT INTO assess VALUES ({})'.format(
+                ', '.join('?' * (len(Assessment._fields) + 1))),
+            [(step, r.pattern, i, r.length, r.mode, r.center, r.quality,
+              r.stats, r.clustersize, r.verdict, r.source,
+              sqlite3.Binary(np.ascontiguousarray(r.so3).tostring()), r.ev)
+             for i, r in enumerate(records)])
+    db.commit()
+    db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compile the stepN_assess files of a directory into '
+        'an indexed SQLite store.')
+    parser.add_argument('assess_dir', help='Directory of stepN_assess files')
+    parser.add_argument('store', help='SQLite file to create')
+    args = parser.parse_args()
+    compile_store(args.assess_dir, args.store)
@@ -8,6 +8,7 @@
 
 import sys
 import re
+from bisect import bisect_left, bisect_right
 
 # C really means Calpha, and O means the other C in the peptide unit.
 mod3_to_atom = ("N", "C", "O")
@@ -352,6 +353,79 @@ class CDP:
             sep = ";; "
         return sep.join(seg.as_string() for seg in self.segments)
 
+    def anchor_offsets(self, prot, strict):
+        """Return the offsets of the first segment at which a match is
+        possible, in increasing order, or None if all offsets must be
+        tried.
+
+        Every H-bond vertex must be mapped to an end of a chord of
+        prot, of the right atom, and with the other end at a distance
+        that is fixed if the other vertex is in the same segment, and
+        otherwise such that the two segments do not overlap (and are in
+        order, if strict). We take the vertex with the fewest such chord
+        ends in prot.bond_index(), among the segments connected to the
+        first one by H-bonds, and follow the chords of prot from each
+        end back to the first segment."""
+        # An isolated vertex at a Calpha trips the assertion in
+        # get_Hbond; leave that to the full scan.
+        for seg in self.segments:
+            for j,v in enumerate(seg.vertices):
+                if v.type == "i" and (seg.mod3 + j) % 3 == 1:
+                    return None
+        # path[k] = (x, l, y): the x'th vertex of segment k is bonded
+        # to the y'th vertex of segment l, which is closer to segment 0.
+        path = {0: None}
+        queue = [0]
+        for l in queue:
+            for y,v in enumerate(self.segments[l].vertices):
+                if v.type != "c":
+                    continue
+                w = v.data.other_end(v)
+                k = w.segment.sidx
+                if k not in path:
+                    path[k] = (w.vidx, l, y)
+                    queue.append(k)
+
+        index = prot.bond_index()
+        best = None
+        for i in queue:
+            seg = self.segments[i]
+            for j,v in enumerate(seg.vertices):
+                if v.type != "c":
+                    continue
+                w = v.data.other_end(v)
+                (k, m) = (w.segment.sidx, w.vidx)
+                if k == i:
+                    ranges = [(m-j, m-j)]
+                elif k > i or not strict:
+                    ranges = [(len(seg)+m-j, None)]
+                    if not strict:
+                        ranges.append((None, m-j-len(self.segments[k])))
+                else:
+                    ranges = [(None, m-j-len(self.segments[k]))]
+                mod3 = (seg.mod3 + j) % 3
+                ends = [index.ends(mod3, lo, hi) for (lo, hi) in ranges]
+                n = sum(len(e) for e in ends)
+                if best is None or n < best[0]:
+                    best = (n, i, j, ends)
+        if best is None:
+            return None
+
+        (n, i, j, ends) = best
+        offsets = set()
+        for e in ends:
+            for p in e:
+                (k, o) = (i, p-j)
+                while k != 0:
+                    (x, l, y) = path[k]
+                    c = prot.get_Hbond(o+x)
+                    if c is None:
+                        break
+                    (k, o) = (l, c.other_end(o+x)-y)
+                else:
+                    offsets.add(o)
+        return sorted(offsets)
+
     def find_matches(self, prot, strict = None, color_bonds = False):
         if strict is None:
             strict = self.strict
@@ -360,8 +434,15 @@ class CDP:
         seg0 = self.segments[0]
         # The first segment must be mapped to a position matching its
         # first atom. We start from [(the largest multiple of 3 <=
-        # prot.minidx) + (seg0.mod3)], then proceed in steps of 3.
-        for f in range((prot.minidx//3)*3 + seg0.mod3, prot.maxidx, 3):
+        # prot.minidx) + (seg0.mod3)], then proceed in steps of 3,
+        # unless anchor_offsets tells us where to look.
+        start = (prot.minidx//3)*3 + seg0.mod3
+        candidates = self.anchor_offsets(prot, strict)
+        if candidates is None:
+            candidates = range(start, prot.maxidx, 3)
+        else:
+            candidates = [f for f in candidates if start <= f < prot.maxidx]
+        for f in candidates:
             offsets = [None] * len(self.segments)
             offsets[0] = f
             segs_to_process = [0]
@@ -560,6 +641,48 @@ class Tbond:
         return False;
 
 
+class BondIndex:
+    """The ends of the Hbonds of a protein, by atom (index mod 3) and
+    signed distance to the other end, for CDP.anchor_offsets."""
+
+    def __init__(self, prot):
+        ends = {0: [], 2: []}
+        for hb in prot.Hbonds:
+            for p in (hb.donor, hb.accptr):
+                ends[p % 3].append((hb.other_end(p) - p, p))
+        self.dists = dict()
+        self.positions = dict()
+        for mod3,l in ends.iteritems():
+            l.sort()
+            self.dists[mod3] = [d for d,p in l]
+            self.positions[mod3] = [p for d,p in l]
+
+    def ends(self, mod3, lo = None, hi = None):
+        """Return the Hbond ends at atoms with index mod 3 equal to mod3
+        whose other end is at distance d, lo <= d <= hi (None meaning
+        unbounded)."""
+        if mod3 not in self.dists:
+            return []
+        d = self.dists[mod3]
+        i = 0 if lo is None else bisect_left(d, lo)
+        j = len(d) if hi is None else bisect_right(d, hi)
+        return self.positions[mod3][i:j]
+
+
+class HbondRecord:
+    """A line of a protein file, as needed for adding it as an Hbond."""
+    def __init__(self, linenumber, i, j, length, cluster, energy, flags, residues, matrix):
+        self.linenumber = linenumber
+        self.i = i
+        self.j = j
+        self.length = length
+        self.cluster = cluster
+        self.energy = float(energy)
+        self.flags = flags
+        self.residues = residues
+        self.so3matrix = matrix
+
+
 class Protein:
     simplify_ssclass = {'G':'H', 'H':'H', 'I':'H', 'E':'S', 'B':'-', 'T':'-', 'S':'-', '-':'-', '?':'-', '*':'-'}
 
@@ -572,6 +695,13 @@ class Protein:
         self.Tbonds = []
         self.minidx = 2 ** 20
         self.maxidx = -1
+        self._bond_index = None
+
+    def bond_index(self):
+        """The BondIndex of the Hbonds, built on first use."""
+        if self._bond_index is None:
+            self._bond_index = BondIndex(self)
+        return self._bond_index
 
     def add_residue(self, idx, r):
         if r == "?":
@@ -649,6 +779,7 @@ class Protein:
             self.add_residue((j-1)//3, residues[2])
             self.add_residue((j+2)//3, residues[3])
         hb = Hbond(linenumber, i, j, length = length, cluster = cluster, flags = flags, residues = residues, so3matrix = so3matrix)
+        self._bond_index = None
         self.Hbonds.append(hb)
         self.vertices[i] = hb
         self.vertices[j] = hb
@@ -679,6 +810,12 @@ class Protein:
         if self.name is None:
             self.name = fn
 
+        with open(fn) as f:
+            self.from_lines(f)
+
+    def from_lines(self, lines):
+        """Like from_file, but take the lines of the protein file from
+        the iterable lines."""
         # We use columns 12-13 (aka 13-14 with 1-based indexing); that
         # is what has been used for cluster classification etc.
         # src_col = 10
@@ -698,22 +835,9 @@ class Protein:
         so3_col_start = 50
         so3_col_end = 59
 
-        class Record:
-            def __init__(self, linenumber, i, j, length, cluster, energy, flags, residues, matrix):
-                self.linenumber = linenumber
-                self.i = i
-                self.j = j
-                self.length = length
-                self.cluster = cluster
-                self.energy = float(energy)
-                self.flags = flags
-                self.residues = residues
-                self.so3matrix = matrix
-
-        f = open(fn)
         records = []
         linenumber = 0
-        for line in f:
+        for line in lines:
             linenumber += 1
             fields = line.strip().split()
             i = src_fn(int(fields[src_col]))
@@ -733,9 +857,26 @@ class Protein:
 
             matrix=tuple([tuple([float(fields[so3_col_start + 3*x + y]) for y in range(3)]) for x in range(3)])
 
-            records.append(Record(linenumber, i, j, length, fields[cluster_col], fields[energy_col], flags, residues, matrix))
-        f.close()
+            records.append(HbondRecord(linenumber, i, j, length, fields[cluster_col], fields[energy_col], flags, residues, matrix))
+
+        self.add_Hbond_records(records)
+
+    def from_store(self, store):
+        """Like from_file, but take the lines of the protein file from a
+        protstore.ProteinStore (looked up by self.name) instead of
+        parsing the text file."""
+        records = []
+        for (linenumber, i, j, length, cluster, energy, flags, residues, matrix) in store.hbond_records(self.name):
+            # See from_file for the meaning of the columns and flags.
+            if not re.search("__[US][US]$", flags):
+                continue
+            records.append(HbondRecord(linenumber, 3*i, 3*j+2, length, cluster, energy, flags, residues, matrix))
+
+        self.add_Hbond_records(records)
 
+    def add_Hbond_records(self, records):
+        # When several Hbonds are incident on the same vertex, we keep
+        # the one with the lowest energy.
         records.sort(key=lambda x: x.energy)
         for r in records:
             # print r.i, r.j, r.cluster, r.energy
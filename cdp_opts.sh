@@ -11,11 +11,12 @@
 #
 # Author: Yuki Koyanagi
 # History:
-#  
+#  2026-10-18: Use improve_modebox.py instead of improve_modebox.pl
+#  2026-10-18: Copy so3.py, needed by improve_modebox.py
 
 set -e
 
-IMPROVE_SCRIPT="improve_modebox.pl"
+IMPROVE_SCRIPT="improve_modebox.py"
 EVALUATE_SCRIPT="evaluate_clustering.pl"
 STEP="step$1"
 LOG="${STEP}.log"
@@ -32,9 +33,9 @@ echo "$(date +'%Y-%m-%d %T'): Finished clustering" >> $LOG
 cp $LOG ${STEP}/out
 cd ${STEP}/out
 
-echo "$(date +'%Y-%m-%d %T'): Start improve_modebox.pl" >> $LOG
+echo "$(date +'%Y-%m-%d %T'): Start improve_modebox.py" >> $LOG
 
-cp ../../${IMPROVE_SCRIPT} .
+cp ../../${IMPROVE_SCRIPT} ../../so3.py .
 find . -name '*Summary.txt' | \
     sed 's#_Summary.txt##' | \
     xargs ./${IMPROVE_SCRIPT}
@@ -46,7 +47,7 @@ find . -name '*Summary2.txt' | \
     xargs awk -v d="${p##*/}" '$0=d"/"FILENAME"\t"$0' | \
     sed 's|/./|/|' > ${STEP}_summary2.txt
 
-echo "$(date +'%Y-%m-%d %T'): Finished improve_modebox.pl" >> $LOG
+echo "$(date +'%Y-%m-%d %T'): Finished improve_modebox.py" >> $LOG
 
 #We only need the summary file now, and evaluate_clustering
 #require dir name to be step**
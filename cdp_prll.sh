@@ -12,11 +12,12 @@
 #
 # Author: Yuki Koyanagi
 # History:
-#  
+#  2026-10-18: Use improve_modebox.py instead of improve_modebox.pl
+#  2026-10-18: Copy so3.py, needed by improve_modebox.py
 
 set -e
 
-IMPROVE_SCRIPT="improve_modebox.pl"
+IMPROVE_SCRIPT="improve_modebox.py"
 EVALUATE_SCRIPT="evaluate_clustering.pl"
 STEP="step$1"
 
@@ -30,7 +31,7 @@ echo "$(date +"%Y-%m-%d %T"): Finished clustering for ${STEP}"
 #cd /scratch/${PBS_JOBID}/${STEP}/out
 cd ${STEP}/out
 
-cp ../../${IMPROVE_SCRIPT} .
+cp ../../${IMPROVE_SCRIPT} ../../so3.py .
 find . -name '*Summary.txt' | \
     sed 's#_Summary.txt##' | \
     xargs ./${IMPROVE_SCRIPT}
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# File: clustcache.py
+#
+# Time-stamp: <>
+#
+# Description: A cache of clustering results (the content of
+#  _Summary2.txt) keyed by the rotations clustered, so that a group of
+#  rotations that turns up again, under another pattern name, in
+#  another step or in another run, is only clustered once. Entries are
+#  files in a directory, named by the SHA-1 of the rotation file
+#  content (and the name of the clustering engine), so the cache can
+#  be shared by any number of processes, also on different nodes:
+#  entries are written to a temporary file and renamed into place,
+#  and a hit touches the entry, so that evict() can remove the least
+#  recently used entries when the cache grows beyond max_bytes.
+#
+# History:
+#  2026-10-18: Created
+#
+
+import errno
+import fcntl
+import hashlib
+import os
+import tempfile
+
+
+def rotation_text(data):
+    """The content of the rotation file for data, the rotations of a
+    pattern as lists of strings; see abacus/clstr.py."""
+    return '\n'.join(['\t'.join(d) for d in data])
+
+
+class ClusterCache:
+    """
+    The cache in directory cache_dir. If max_bytes is given, evict()
+    is run after every evict_every new entries.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None, evict_every=1000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    @staticmethod
+    def key(text, engine=''):
+        """The key of the rotation file content text."""
+        h = hashlib.sha1(engine)
+        h.update('\0')
+        h.update(text)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key[2:])
+
+    def get(self, key):
+        """The cached result for key, or None."""
+        p = self.path(key)
+        try:
+            with open(p) as f:
+                res = f.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self.misses += 1
+            return None
+        try:
+            os.utime(p, None)
+        except OSError:
+            # Evicted in the meantime; we have read it anyway.
+            pass
+        self.hits += 1
+        return res
+
+    def put(self, key, res):
+        p = self.path(key)
+        d = os.path.dirname(p)
+        try:
+            os.mkdir(d)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp = tempfile.mkstemp(dir=d, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(res)
+            os.rename(tmp, p)
+        except:
+            os.unlink(tmp)
+            raise
+        self.puts += 1
+        if self.max_bytes is not None and self.puts % self.evict_every == 0:
+            self.evict()
+
+    def entries(self):
+        """Yield (last use, size, path) of all entries."""
+        for d in os.listdir(self.cache_dir):
+            sub = os.path.join(self.cache_dir, d)
+            if not os.path.isdir(sub):
+                continue
+            for fn in os.listdir(sub):
+                if fn.startswith('.tmp'):
+                    continue
+                p = os.path.join(sub, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, p
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is at
+        most max_bytes. Does nothing if another process is already
+        evicting."""
+        if self.max_bytes is None:
+            return
+        with open(os.path.join(self.cache_dir, '.lock'), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                return
+            entries = sorted(self.entries())
+            total = sum(e[1] for e in entries)
+            for _, size, p in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(p)
+                except OSError:
+                    continue
+                total -= size
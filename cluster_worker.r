@@ -0,0 +1,41 @@
+
+# Rscript cluster_worker.r StartClustSubsetVers4.txt
+#
+# Long-lived clustering worker, used by rpool.py. Sources the
+# clustering code once, then reads jobs from stdin, each a header line
+#   {number of rotations}\t{label}
+# followed by that many lines of rotations (e1 e2 e3 theta), and runs
+# StartNew(label, rot) on them, which writes {label}_Summary.txt and
+# {label}_BoxId.txt as Rasmus2.r does. Everything StartNew prints goes
+# to stdout as usual; the end of each job is marked by a line
+#   @@cdp-worker OK
+# or
+#   @@cdp-worker ERROR {message}
+
+source(commandArgs(TRUE)[1])
+
+marker="@@cdp-worker"
+input=file("stdin")
+open(input)
+
+cat(marker, " READY\n", sep="")
+flush(stdout())
+
+repeat {
+  header=readLines(input, n=1)
+  if (length(header)==0) break
+  header=strsplit(header, "\t")[[1]]
+  n=as.integer(header[1])
+  label=header[2]
+  lines=readLines(input, n=n)
+  starttime=Sys.time()
+  res=tryCatch({
+    rot=matrix(scan(text=lines, quiet=TRUE),,4,byrow=T)
+    StartNew(label, rot)
+    "OK"
+  }, error=function(e) paste("ERROR", gsub("\n", " ", conditionMessage(e))))
+  stoptime=Sys.time()
+  print(difftime(stoptime, starttime, units="secs"))
+  cat(marker, " ", res, "\n", sep="")
+  flush(stdout())
+}
@@ -5,19 +5,22 @@
 # Time-stamp: <2016-12-07 13:11:24 au447708>
 #
 # Description: Analyse prediction results in terms of cluster size.
-# Takes two arguments, the prediction file and 'assess' directory.
+# Takes two arguments, the prediction file and 'assess' directory
+# (or a store compiled from it by assessstore.py).
 # Returns a list containing tuples of: protein id, lineno,
 # SO3 distance, pattern, clustersize
 #
 # Author: Yuki Koyanagi
 # History:
+#  2026-10-18: Look up the cluster sizes with assessstore
 #
 import os
 import os.path
-import itertools
 import argparse
 import collections
 
+import assessstore
+
 fields = ['protid', 'lineno', 'so3', 'pattern', 'step']
 Prediction = collections.namedtuple('Prediction', fields)
 
@@ -26,11 +29,12 @@ def analyse(predf, assessd):
     """
     Return a list given prediction file and assessment dir
     """
-    assert os.path.isdir(assessd),\
-        '{} is not a directory'.format(assessd)
+    assert os.path.exists(assessd),\
+        '{} does not exist'.format(assessd)
     assert os.path.isfile(predf),\
         '{} is not a file'.format(predf)
 
+    assessments = assessstore.open_assessments(assessd)
     result = []
     # Read prediction file
     with open(predf) as predf:
@@ -38,31 +42,28 @@ def analyse(predf, assessd):
     for line in lines:
         args = [line.split()[i] for i in [0, 1, 3, 5, 7]]
         pred = Prediction(*args)
-        rec = tuple(pred) + (getsize(pred, assessd),)
+        rec = tuple(pred) + (getsize(pred, assessments),)
         result.append(rec)
     return result
 
 
-def getsize(prediction, assessd):
+def getsize(prediction, assessments):
     """
     Return the cluster size given step and pattern info
     """
-    s = 'Processing step{}/{}'.format(prediction.step,
-                                      prediction.pattern)
-    f = os.path.join(assessd, 'step{}_assess'.format(prediction.step))
-    with open(f) as assessf:
-        for line in assessf:
-            if s in line:
-                t = list(itertools.islice(assessf, 5))[-1]
-                break
-    return t.split()[2]
+    a = assessments.get(int(prediction.step), prediction.pattern)
+    if a is None:
+        raise KeyError('step{}/{} has not been assessed'.format(
+            prediction.step, prediction.pattern))
+    return a.clustersize
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('pred_file', help='Prediction file')
     parser.add_argument('assess_dir', help='Directory containing '
-                        'assess files')
+                        'assess files, or a store compiled by '
+                        'assessstore.py')
     args = parser.parse_args()
     for line in analyse(args.pred_file, args.assess_dir):
         print '\t'.join(line)
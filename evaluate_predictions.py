@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+#
+# File: evaluate_predictions.py
+#
+# Time-stamp: <>
+#
+# usage: evaluate_predictions.py [-h] [--min-quality Q]
+#                                [--thresholds T,T,...] [--bins N]
+#                                [--patterns N] [--assess ASSESS]
+#                                [--protdir DIR] [--summary-only]
+#                                [--jobs N]
+#                                prediction [prediction ...]
+#
+# Reports the accuracy of the predictions written by
+# predict_rotation(.py): for all Hbonds, by length class (L or not),
+# by quality (rounded down), by step and by pattern (the most frequent
+# ones), the number of Hbonds and the mean and median SO(3) distance
+# between guess and actual rotation, and the fraction closer than each
+# threshold; and a histogram of the distances. The distances are
+# those of the prediction file (column 4), or, with --assess and
+# --protdir, computed again from the mode boxes in the assess
+# directory or store and the rotations in the protein files. The
+# prediction files, e.g. of many runs, are evaluated in --jobs
+# processes; with more than one file, a table comparing them follows
+# the reports.
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: Count distances printed as 3.141593 in the last bin
+#
+
+import argparse
+import multiprocessing
+import os
+
+import numpy as np
+
+import so3
+from assessstore import open_assessments
+from predict_rotation import read_rotations
+
+columns = [('protein', str), ('line', int), ('quality', float),
+           ('distance', float), ('guess', str), ('pattern', str),
+           ('length', str), ('step', int)]
+
+
+def read_predictions(fn):
+    """{column: array} of prediction file fn."""
+    with open(fn) as f:
+        rows = [l.rstrip('\n').split('\t') for l in f if l.strip()]
+    cols = zip(*rows) if rows else [()] * len(columns)
+    return dict((name, np.array(c, dtype=t))
+                for (name, t), c in zip(columns, cols))
+
+
+def recompute_distances(pred, assess, protdir):
+    """The SO(3) distances between the guesses in pred, looked up in
+    assess, and the rotations in the protein files in protdir."""
+    n = len(pred['line'])
+    guessed = np.empty((n, 3, 3))
+    guessed[:] = np.eye(3)
+    keys = np.core.defchararray.add(pred['step'].astype(str),
+                                    np.core.defchararray.add(
+                                        '/', pred['pattern']))
+    uniq, inv = np.unique(keys, return_inverse=True)
+    for k, key in enumerate(uniq):
+        step, pattern = key.split('/', 1)
+        if int(step) < 0:
+            continue
+        a = assess.get(int(step), pattern)
+        if a is None:
+            raise KeyError('step{}/{} has not been assessed'.format(
+                step, pattern))
+        guessed[inv == k] = a.so3
+    rot = np.empty((n, 4))
+    for prot in np.unique(pred['protein']):
+        sel = pred['protein'] == prot
+        r = read_rotations(os.path.join(protdir, prot + '.txt'))
+        rot[sel] = r[pred['line'][sel] - 1]
+    actual = so3.axis_angle_to_matrix(rot[:, :3], rot[:, 3], False)
+    return so3.acos_real((so3.trace_products(actual, guessed) - 1)/2)
+
+
+def group_stats(keys, dist, thresholds):
+    """(keys, count, mean, median, [fraction below t for t in
+    thresholds]) of dist grouped by the distinct keys."""
+    uniq, inv = np.unique(keys, return_inverse=True)
+    m = len(uniq)
+    n = np.bincount(inv, minlength=m)
+    mean = np.bincount(inv, dist, m) / n
+    below = [np.bincount(inv, dist < t, m) / n for t in thresholds]
+    s = dist[np.lexsort((dist, inv))]
+    starts = np.cumsum(n) - n
+    median = (s[starts + (n - 1)//2] + s[starts + n//2]) / 2
+    return uniq, n, mean, median, below
+
+
+def format_table(title, heading, stats, thresholds, order=None):
+    keys, n, mean, median, below = stats
+    lines = ['# ' + title,
+             '\t'.join([heading, 'n', 'mean', 'median'] +
+                       ['<{:g}'.format(t) for t in thresholds])]
+    for i in (xrange(len(keys)) if order is None else order):
+        lines.append('\t'.join(['{}'.format(keys[i]), str(n[i]),
+                                '%.4f' % mean[i], '%.4f' % median[i]] +
+                               ['%.4f' % b[i] for b in below]))
+    return '\n'.join(lines) + '\n'
+
+
+def histogram(dist, bins):
+    # %f rounds pi up to 3.141593, just outside the range
+    counts, edges = np.histogram(np.clip(dist, 0, np.pi), bins, (0, np.pi))
+    cum = np.cumsum(counts) / float(max(len(dist), 1))
+    lines = ['# Histogram of distances', 'from\tto\tn\tfraction\tcumulative']
+    for lo, hi, c, f in zip(edges[:-1], edges[1:], counts, cum):
+        lines.append('%.4f\t%.4f\t%d\t%.4f\t%.4f' % (
+            lo, hi, c, c / float(max(len(dist), 1)), f))
+    return '\n'.join(lines) + '\n'
+
+
+def evaluate(fn, args):
+    """(report, overall stats) of prediction file fn."""
+    pred = read_predictions(fn)
+    keep = pred['quality'] >= args.min_quality
+    pred = dict((k, v[keep]) for k, v in pred.iteritems())
+    if args.assess:
+        dist = recompute_distances(
+            pred, open_assessments(args.assess, True), args.protdir)
+    else:
+        dist = pred['distance']
+    if not len(dist):
+        return '# {}: no predictions\n'.format(fn), None
+    t = args.thresholds
+    overall = group_stats(np.full(len(dist), 'all'), dist, t)
+    by_pattern = group_stats(pred['pattern'], dist, t)
+    top = np.argsort(-by_pattern[1], kind='mergesort')[:args.patterns]
+    report = ''.join([
+        '# {}\n'.format(fn),
+        format_table('All Hbonds', 'all', overall, t),
+        format_table('By length class', 'length',
+                     group_stats(np.where(pred['length'] == 'L', 'L', 'nonL'),
+                                 dist, t), t),
+        format_table('By quality', 'quality',
+                     group_stats(np.floor(pred['quality']).astype(int),
+                                 dist, t), t),
+        format_table('By step', 'step', group_stats(pred['step'], dist, t), t),
+        format_table('The {} most frequent patterns'.format(len(top)),
+                     'pattern', by_pattern, t, top),
+        histogram(dist, args.bins)])
+    return report, [s[0] for s in overall[1:4]] + [b[0] for b in overall[4]]
+
+
+def _evaluate(a):
+    return evaluate(*a)
+
+
+def main(args):
+    jobs = [(fn, args) for fn in args.prediction]
+    if args.jobs > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(args.jobs)
+        try:
+            results = pool.map(_evaluate, jobs)
+        finally:
+            pool.terminate()
+    else:
+        results = map(_evaluate, jobs)
+    if not args.summary_only:
+        print '\n'.join(report for report, _ in results),
+    if len(results) > 1 or args.summary_only:
+        if not args.summary_only:
+            print
+        print '# Summary'
+        print '\t'.join(['file', 'n', 'mean', 'median'] +
+                        ['<{:g}'.format(t) for t in args.thresholds])
+        for fn, (_, s) in zip(args.prediction, results):
+            if s is not None:
+                print '\t'.join([fn, str(s[0])] + ['%.4f' % x for x in s[1:]])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Report the accuracy of rotation predictions.')
+    parser.add_argument('prediction', nargs='+',
+                        help='Prediction files written by predict_rotation')
+    parser.add_argument('--min-quality', type=float, default=-np.inf,
+                        metavar='Q', help='Only use guesses of quality '
+                        'at least Q')
+    parser.add_argument('--thresholds', default='0.1,0.25,0.5,1',
+                        metavar='T,T,...',
+                        help='Distances to report the fraction below')
+    parser.add_argument('--bins', type=int, default=18, metavar='N',
+                        help='Number of histogram bins between 0 and pi')
+    parser.add_argument('--patterns', type=int, default=20, metavar='N',
+                        help='Number of patterns to report')
+    parser.add_argument('--assess',
+                        help='Assess directory or store; compute the '
+                        'distances again from its mode boxes')
+    parser.add_argument('--protdir',
+                        help='Directory of the protein files, for --assess')
+    parser.add_argument('--summary-only', action='store_true',
+                        help='Only print the table comparing the files')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='Number of files evaluated at once')
+    args = parser.parse_args()
+    args.thresholds = [float(t) for t in args.thresholds.split(',')]
+    if args.assess and not args.protdir:
+        parser.error('--assess needs --protdir')
+    main(args)
@@ -4,13 +4,14 @@
 #
 # Time-stamp: <2016-05-13 10:48:58 au447708>
 #
-# usage: filter_bonds.py [-h] source destination minimum
+# usage: filter_bonds.py [-h] source destination minimum [minimum ...]
 #
 # Filters out bonds with no. of occurrence less than the specified number
 #
 # positional arguments:
 #   source       File to be filtered
-#   destination  Filtered file
+#   destination  Filtered file. With more than one minimum, {} is
+#                replaced by the minimum, e.g. n{}/filtered.txt
 #   minimum      Minimum no. of occurrence
 #
 # optional arguments:
@@ -21,35 +22,72 @@
 #  2016/03/08: yk: Created
 #  2016/03/17: yk: Can now be imported as module
 #  2016/05/13: yk: Now filters by bond desc and residue class
+#  2026/10/18: Several minimums can be given, filtering for all of
+#  them with a single counting pass over the source.
 #
 
 import argparse
-import collections
+import array
+import itertools
 
 bond_col = 6  # Bond description is 7th column in the input file
 res_col = 7  # Residue description is 8th column in the input file
 
 
-def filter(source, dest, minimum):
-    # Read bonds
-    bonds = collections.Counter()
+def bond_key(line):
+    cols = line.split('\t')
+    return '{b}_{r}'.format(
+        b=cols[bond_col].strip(),
+        r=cols[res_col].strip())
+
+
+def count_bonds(source):
+    """
+    Count the lines of source per bond description and residue class.
+    Returns (counts, ids), where ids[k] is the key id of line k and
+    counts[i] the number of lines with key id i.
+    """
+    key_ids = dict()
+    counts = array.array('l')
+    ids = array.array('l')
     with open(source) as f:
         for line in f:
-            cols = line.split('\t')
-            bond = '{b}_{r}'.format(
-                b=cols[bond_col].strip(),
-                r=cols[res_col].strip())
-            bonds[bond] += 1
+            key = bond_key(line)
+            i = key_ids.get(key)
+            if i is None:
+                i = key_ids[key] = len(counts)
+                counts.append(0)
+            counts[i] += 1
+            ids.append(i)
+    return counts, ids
+
 
-    # If count greater than specified, copy to output
-    with open(source) as s, open(dest, 'w') as d:
-        for line in s:
-            cols = line.split('\t')
-            bond = '{b}_{r}'.format(
-                b=cols[bond_col].strip(),
-                r=cols[res_col].strip())
-            if bonds.get(bond) >= minimum:
-                d.write(line)
+def filter_multi(source, dests):
+    """
+    Filter source for several minimums at once. dests is a list of
+    (minimum, destination) pairs; the lines whose bond occurs at least
+    minimum times are copied to destination. source is read twice in
+    total, no matter how many destinations there are; the second pass
+    uses the key ids of the first one instead of parsing the lines
+    again.
+    """
+    counts, ids = count_bonds(source)
+
+    outs = [(minimum, open(dest, 'w')) for minimum, dest in dests]
+    try:
+        with open(source) as s:
+            for i, line in itertools.izip(ids, s):
+                count = counts[i]
+                for minimum, d in outs:
+                    if count >= minimum:
+                        d.write(line)
+    finally:
+        for minimum, d in outs:
+            d.close()
+
+
+def filter(source, dest, minimum):
+    filter_multi(source, [(minimum, dest)])
 
 
 if __name__ == '__main__':
@@ -59,8 +97,17 @@ if __name__ == '__main__':
         'than the specified number')
     parser.add_argument('source',
                         help='File to be filtered')
-    parser.add_argument('destination', help='Filtered file')
-    parser.add_argument('minimum', type=int,
+    parser.add_argument('destination', help='Filtered file. With '
+                        'more than one minimum, {} is replaced by '
+                        'the minimum, e.g. n{}/filtered.txt')
+    parser.add_argument('minimum', type=int, nargs='+',
                         help='Minimum no. of occurrence')
     args = parser.parse_args()
-    filter(args.source, args.destination, args.minimum)
+    if len(args.minimum) > 1 and '{}' not in args.destination:
+        parser.error('destination must contain {} when giving more '
+                     'than one minimum')
+    if len(args.minimum) == 1:
+        filter(args.source, args.destination, args.minimum[0])
+    else:
+        filter_multi(args.source, [(m, args.destination.format(m))
+                                   for m in args.minimum])
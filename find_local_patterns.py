@@ -4,30 +4,70 @@
 # Author: Rasmus Villemoes
 # History:
 #  2016/03/04: yk: added output argument
+#  2026/10/18: Can now be imported as a module; options are passed
+#   around in a PatternConfig instead of module globals.
+#  2026/10/18: Added --jobs, describing proteins in parallel.
+#  2026/10/18: The sliding window patterns (--acid-length) are
+#   computed for all windows of a protein at once, using NumPy.
+#  2026/10/18: normalized_toptype works on the atom specs instead of
+#   running regular expressions over the joined pattern, and
+#   remembers recent results.
+#  2026/10/18: The raw patterns of the Hbonds of an ArrayProtein are
+#   computed for all Hbonds at once, from its columns.
 
 import sys
 import os
 import platform
 import itertools
+import collections
 
 import string
 import gc
 import re
 
+import numpy as np
 
 from cdp import *
-
-window_size = 3
-
-nearby_remotes = 2
-remote_sign = False
-always_include_remotes = False
-nearby_twists = -1
-
-residue_scheme = 0
-
-pid = os.getpid()
-hostname = platform.node()
+from protstore import ProteinStore
+from protarray import ArrayProtein
+
+
+class PatternConfig:
+    """The options controlling how local patterns are described. The
+    defaults are those of the command line options of the same names."""
+
+    def __init__(self, window_size = 3, nearby_remotes = 2, nearby_twists = -1,
+                 remote_sign = False, always_include_remotes = False,
+                 residue_scheme = 0, show_residues = True, show_ssclass = False,
+                 acid_length = 0, trim_size = 0):
+        self.window_size = window_size
+        self.nearby_remotes = nearby_remotes
+        self.nearby_twists = nearby_twists
+        self.remote_sign = remote_sign
+        self.always_include_remotes = always_include_remotes
+        self.residue_scheme = residue_scheme
+        self.show_residues = show_residues
+        self.show_ssclass = show_ssclass
+        self.acid_length = acid_length
+        self.trim_size = trim_size
+
+    @staticmethod
+    def from_args(args):
+        return PatternConfig(window_size = args.window_size,
+                             nearby_remotes = args.nearby_remotes,
+                             nearby_twists = args.nearby_twists,
+                             remote_sign = args.remote_sign,
+                             always_include_remotes = args.always_include_remotes,
+                             residue_scheme = args.residue_scheme,
+                             show_residues = args.show_residues,
+                             show_ssclass = args.show_ssclass,
+                             acid_length = args.acid_length,
+                             trim_size = args.trim_size)
+
+    @staticmethod
+    def from_opts_file(f):
+        """Read an option file, as created by create_opts.py."""
+        return PatternConfig.from_args(option_parser().parse_args(open(f).read().split()))
 
 
 # Hm, ok, assuming that "i" was late enough in the alphabet so that
@@ -70,7 +110,7 @@ residue_schemes = [
     create_residue_scheme("LVIFMAGSC", "EKRDTYNQHWP", "X"),
 ]
 
-def simplify_residues(s):
+def simplify_residues(s, residue_scheme):
     d = residue_schemes[residue_scheme]
     return "".join(d[c] for c in s)
 
@@ -116,74 +156,6 @@ def simplify_residues(s):
 #             c += 1
 #     return c
 
-def handle_nearby_remotes(central_char, s, leftmost):
-    if s is None:
-        return None
-
-    # s is a list of backbone atom specs; each consist of a single
-    # letter followed by zero or more special characters. Lower-case
-    # letters are for N and O atoms, upper-case for Calphas.
-
-    apos = [i for i in range(len(s)) if s[i][0] == central_char]
-    assert(len(apos) == 1 or len(apos) == 2)
-
-    for i in range(len(s)):
-        if s[i][0] not in remote_char:
-            continue
-        # Count the number of atoms between position i and each of the
-        # a-positions.
-        nearby = False
-        for a in apos:
-            if i < a and a - i <= nearby_remotes:
-                nearby = True
-            elif i > a and i - a <= nearby_remotes:
-                nearby = True
-        if not nearby:
-            s[i] = isolated_char[(leftmost + i) % 3]
-
-    return s
-
-def handle_nearby_twists(central_char, s, leftmost):
-    if s is None:
-        return None
-
-    # A twisted H-bond is indicated by a lowercase letter followed
-    # somewhere by the 'flag' ~. If we are too far from the central
-    # bond, we want to just delete the ~. If we are close enough, the
-    # leading char should be replaced by its opposite cousin (a by z,
-    # b by y etc.).
-    #
-    # Note that this is actually somewhat broken, since the two ends
-    # of a bond may end up being denoted by different characters. So
-    # for now one should only use a value of --nearby-twists of either
-    # -1 (disable, the default), 0 (only annotate the a-bond), or
-    # "infinity" (in practice, the selected window size).
-
-    apos = [i for i in range(len(s)) if s[i][0] == central_char]
-    assert(len(apos) == 1 or len(apos) == 2)
-
-    for i in range(len(s)):
-        if "~" not in s[i]:
-            continue
-
-        # Count the number of atoms between position i and each of the
-        # a-positions.
-        nearby = False
-        for a in apos:
-            if i <= a and a - i <= nearby_twists:
-                nearby = True
-            elif i >= a and i - a <= nearby_twists:
-                nearby = True
-        new = s[i].replace("~", "")
-        if nearby:
-            s[i] = chr(ord("z") - (ord(new[0]) - ord("a"))) + new[1:]
-        else:
-            s[i] = new
-
-    return s
-
-
-
 def read_whitelist_files(l):
     wl = dict()
     for f in l:
@@ -196,31 +168,138 @@ def read_whitelist_files(l):
             wl[prot].add(lineno)
     return wl
 
-def normalized_toptype(central_char, specL, specL_index, specR = None, specR_index = None):
-    specL = handle_nearby_remotes(central_char, specL, specL_index)
-    specR = handle_nearby_remotes(central_char, specR, specR_index)
-    specL = handle_nearby_twists(central_char, specL, specL_index)
-    specR = handle_nearby_twists(central_char, specR, specR_index)
+class LRUCache:
+    """A mapping holding at most maxsize items; when full, the least
+    recently used item is dropped."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.items = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self.items.pop(key)
+        except KeyError:
+            return default
+        self.items[key] = value
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        if len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def __len__(self):
+        return len(self.items)
+
+# Helices make the same raw pattern very common, so normalized_toptype
+# remembers its recent results.
+toptype_memo = LRUCache(1 << 16)
+
+# Local bonds other than the central one, cf. ignore_remotes_if_local.
+other_local_chars = frozenset("bcdefghijk")
+
+def normalized_segment(config, central_char, s, leftmost):
+    """Normalize the list of atom specs s of a segment starting at atom
+    leftmost; return a new list.
+
+    s is a list of backbone atom specs; each consist of a single
+    letter followed by zero or more special characters. Lower-case
+    letters are for N and O atoms, upper-case for Calphas.
+
+    Remote bonds are replaced by isolated atoms unless they are within
+    config.nearby_remotes atoms of the central bond. A twisted H-bond
+    is indicated by a lowercase letter followed by the 'flag' ~. If we
+    are too far from the central bond (config.nearby_twists), we just
+    delete the ~. If we are close enough, the leading char is replaced
+    by its opposite cousin (a by z, b by y etc.).
+
+    Note that the twist handling is actually somewhat broken, since
+    the two ends of a bond may end up being denoted by different
+    characters. So for now one should only use a value of
+    --nearby-twists of either -1 (disable, the default), 0 (only
+    annotate the a-bond), or "infinity" (in practice, the selected
+    window size).
+
+    Finally, the +/- of remote bonds are dropped unless
+    config.remote_sign is set."""
+
+    apos = [i for i, x in enumerate(s) if x[0] == central_char]
+    assert(len(apos) == 1 or len(apos) == 2)
+
+    nearby_remotes = config.nearby_remotes
+    nearby_twists = config.nearby_twists
+    remote_sign = config.remote_sign
+
+    out = []
+    for i, x in enumerate(s):
+        if x[0] in remote_char:
+            if not [a for a in apos if 0 < abs(i - a) <= nearby_remotes]:
+                x = isolated_char[(leftmost + i) % 3]
+        if "~" in x:
+            x = x.replace("~", "")
+            if [a for a in apos if abs(i - a) <= nearby_twists]:
+                x = chr(ord("z") - (ord(x[0]) - ord("a"))) + x[1:]
+        if not remote_sign and len(x) > 1:
+            x = x.replace("+", "").replace("-", "")
+        out.append(x)
+    return out
+
+def normalized_toptype(config, central_char, specL, specL_index, specR = None, specR_index = None):
+    key = (config.window_size, config.nearby_remotes, config.nearby_twists,
+           config.remote_sign, config.always_include_remotes, central_char,
+           tuple(specL), specL_index % 3,
+           None if specR is None else tuple(specR),
+           None if specR_index is None else specR_index % 3)
+    top = toptype_memo.get(key)
+    if top is None:
+        top = normalize_toptype(config, central_char, specL, specL_index, specR, specR_index)
+        toptype_memo.put(key, top)
+    return top
+
+def normalize_toptype(config, central_char, specL, specL_index, specR = None, specR_index = None):
+    specL = normalized_segment(config, central_char, specL, specL_index)
+    if specR is not None:
+        specR = normalized_segment(config, central_char, specR, specR_index)
+
+    if not config.always_include_remotes:
+        # ignore_remotes_if_local; in the case of two segments, only
+        # local bonds connecting the two count.
+        local = other_local_chars.intersection(x[0] for x in specL)
+        if specR is not None:
+            local = local.intersection(x[0] for x in specR)
+        if local:
+            for spec in (specL, specR):
+                if spec is None:
+                    continue
+                for i, x in enumerate(spec):
+                    for r, c in ((remote_N_char, isolated_N_char),
+                                 (remote_C_char, isolated_C_char),
+                                 (remote_O_char, isolated_O_char)):
+                        if x[0] == r:
+                            x = c
+                    spec[i] = x
 
     top = "".join(specL)
     if specR is not None:
         top += ":"
         top += "".join(specR)
+    return str(config.window_size) + top
 
-    if not remote_sign:
-        top = re.sub("[-+]", "", top)
 
-    if not always_include_remotes:
-        if ((specR is None and re.search("[b-k]", top)) or
-            re.search(r"([b-k])[^:]*:.*\1", top)):
-            top = re.sub(remote_N_char + "[-+]?", isolated_N_char, top)
-            top = re.sub(remote_C_char + "[-+]?", isolated_C_char, top)
-            top = re.sub(remote_O_char + "[-+]?", isolated_O_char, top)
-        
-    return str(window_size) + top
+def describe_local_pattern(config, prot, bond):
+    return normalized_toptype(config, *describe_raw_local_pattern(config, prot, bond))
 
+# The raw pattern is the argument list for normalized_toptype (after
+# the config), that is, (central_char, specL, specL_index, specR, specR_index); specR
+# and specR_index are None if the window around the bond is a single
+# segment. It only depends on config.window_size, so when describing the
+# same bond under several settings of the other options, it can be
+# computed once and then handed to normalized_toptype for each setting.
 
-def describe_local_pattern(prot, bond):
+def describe_raw_local_pattern(config, prot, bond):
+    """Compute the (not yet normalized) local pattern around bond; see
+    the comment above."""
     hbond_char = (x for x in string.ascii_lowercase)
     tbond_char = (x for x in string.ascii_uppercase)
 
@@ -239,6 +318,8 @@ def describe_local_pattern(prot, bond):
     else:
         central_str = central_char
 
+    window_size = config.window_size
+
     # We will look at a window window_size atoms on either side of the
     # two endpoints. These two windows may overlap (or be just
     # adjacent), in which case we create one long segment; otherwise,
@@ -288,7 +369,7 @@ def describe_local_pattern(prot, bond):
             if spec[i] is None:
                 spec[i] = isolated_char[(i + segleft) % 3]
 
-        return normalized_toptype(central_char, spec, segleft)
+        return (central_char, spec, segleft, None, None)
 
         # print "\t".join((prot.name, str(hb.linenumber), str(hb.donor/3), str((hb.accptr-2)/3), 
         #                  hb.cluster, hb.length_class(), normalized_toptype(spec)))
@@ -378,19 +459,19 @@ def describe_local_pattern(prot, bond):
             if specR[i] is None:
                 specR[i] = isolated_char[(i + segRL) % 3]
 
-        return normalized_toptype(central_char, specL, segLL, specR, segRL)
+        return (central_char, specL, segLL, specR, segRL)
 
         # print "\t".join((prot.name, str(hb.linenumber), str(hb.donor/3), str((hb.accptr-2)/3),
         #                  hb.cluster, hb.length_class(), normalized_toptype(specL, specR)))
     
-def cleanup_window_pattern(s):
-    if not remote_sign:
+def cleanup_window_pattern(config, s):
+    if not config.remote_sign:
         s = re.sub("[-+]", "", s)
-    if not always_include_remotes:
+    if not config.always_include_remotes:
         s = re.sub("r[-+]?", "i", s)
     return s
 
-def describe_pattern_window(prot, start, length, trim=0):
+def describe_pattern_window(config, prot, start, length, trim=0):
     """Describe the pattern of Hbonds within the window consisting of the
     LENGTH amino acids starting at START."""
 
@@ -421,93 +502,528 @@ def describe_pattern_window(prot, start, length, trim=0):
 
     # spec = spec[3*trim:3*(length-trim)]
 
-    return cleanup_window_pattern("".join(spec))
+    return cleanup_window_pattern(config, "".join(spec))
+
+
+# Number of windows handled at a time by describe_pattern_windows; each
+# takes 6*length bytes.
+window_block = 4096
+
+def hbond_partners(prot, lo, hi):
+    """Return an array p such that p[k] is the other end of the Hbond
+    at atom lo+k, or -1 if there is none, for lo <= lo+k < hi."""
+    if isinstance(prot, ArrayProtein):
+        donor = prot.donor
+        accptr = prot.accptr
+    else:
+        donor = np.array([hb.donor for hb in prot.Hbonds], dtype=np.int64)
+        accptr = np.array([hb.accptr for hb in prot.Hbonds], dtype=np.int64)
+    p = np.empty(hi - lo, dtype=np.int64)
+    p.fill(-1)
+    for a, b in ((donor, accptr), (accptr, donor)):
+        inside = (a >= lo) & (a < hi)
+        p[a[inside] - lo] = b[inside]
+    return p
+
+def describe_pattern_windows(config, prot, starts, length):
+    """Return describe_pattern_window(config, prot, start, length) for
+    each of the increasing STARTS, computed for all windows at once."""
+
+    assert(length > 0)
+
+    starts = np.asarray(starts, dtype=np.int64)
+    if len(starts) == 0:
+        return []
+    n = 3*length
+    lo = 3*starts[0]
+    partner = hbond_partners(prot, lo, 3*starts[-1] + n)
+
+    offs = np.arange(n)
+    # The spec of window position i is one or two characters; we put
+    # them in columns 2i and 2i+1, with 0 for "no character", and end
+    # each window with a newline.
+    isolated = np.array([ord(isolated_char[i % 3]) for i in xrange(n)], dtype=np.uint8)
+    letters = np.frombuffer(string.ascii_lowercase, dtype=np.uint8)
+
+    patterns = []
+    for b in xrange(0, len(starts), window_block):
+        first = 3*starts[b:b+window_block, None]
+        atoms = first + offs
+        p = partner[atoms - lo]
+        rel = p - first
+        local = (p >= 0) & (rel >= 0) & (rel < n)
+        remote = (p >= 0) & ~local
+        # Local bonds get letters in the order of their left ends.
+        opening = local & (rel > offs)
+        rank = np.cumsum(opening, axis=1) - 1
+        rows = np.arange(len(first))[:, None]
+        letter = np.where(opening, rank, rank[rows, np.where(local, rel, 0)])
+        overflow = (letter >= len(letters)) & local
+        if overflow.any():
+            k = np.flatnonzero(overflow.any(axis=1))[0]
+            raise Exception("%s: more than %d local Hbonds in the window starting at %d"
+                            % (prot.name, len(letters), starts[b+k]))
+
+        chars = np.zeros((len(first), 2*n + 1), dtype=np.uint8)
+        c = chars[:, 0:2*n:2]
+        c[...] = isolated
+        c[remote] = ord(remote_char[0])
+        c[local] = letters[letter[local]]
+        if not config.always_include_remotes:
+            c[c == ord("r")] = ord("i")
+        if config.remote_sign:
+            sign = chars[:, 1:2*n:2]
+            sign[remote & (p > atoms)] = ord("+")
+            sign[remote & (p < atoms)] = ord("-")
+        chars[:, -1] = ord("\n")
+
+        patterns.extend(chars.tostring().replace("\0", "").split("\n")[:-1])
+    return patterns
+
+def bond_partners(prot, lo, hi):
+    """Return arrays (p, twisted) for the ArrayProtein prot such that
+    p[k] is the other end of the Hbond or Tbond at atom lo+k, or -1 if
+    there is none, and twisted[k] whether that bond is twisted, for
+    lo <= lo+k < hi."""
+    p = hbond_partners(prot, lo, hi)
+    twisted = np.zeros(hi - lo, dtype=bool)
+    atoms = np.arange(max(lo, prot.base), min(hi, prot.base + len(prot.bond_of)))
+    b = prot.bond_of[atoms - prot.base]
+    twisted[atoms[b >= 0] - lo] = prot.twisted[b[b >= 0]]
+    for tb in prot.Tbonds:
+        for i, j in ((tb.left, tb.right), (tb.right, tb.left)):
+            if lo <= i < hi:
+                p[i - lo] = j
+    return p, twisted
+
+# The atom specs made by describe_raw_local_patterns, indexed by
+# 4*ord(char) + k for the k'th of these suffixes.
+spec_suffixes = ("", "~", "+", "-")
+spec_strings = [chr(c) + s for c in xrange(128) for s in spec_suffixes]
+
+def describe_raw_local_patterns(config, prot, bonds):
+    """Yield describe_raw_local_pattern(config, prot, bond) for each of
+    the Hbonds bonds of the ArrayProtein prot, computed for all of them
+    at once from the columns of prot."""
+    if not bonds:
+        return
+    w = config.window_size
+    width = 2*w + 1
+    bid = np.array([hb.bid for hb in bonds], dtype=np.int64)
+    left = np.minimum(prot.donor[bid], prot.accptr[bid]).astype(np.int64)[:, None]
+    right = np.maximum(prot.donor[bid], prot.accptr[bid]).astype(np.int64)[:, None]
+
+    # As in describe_raw_local_pattern, a window is one segment from
+    # left-w to right+w, of at most 2*width atoms, or two segments of
+    # width atoms around left and right. Either way, the atoms are put
+    # in 2*width columns, in increasing order, which is the order they
+    # are visited in.
+    single = left + w + 1 >= right - w
+    offs = np.arange(2*width)
+    seg2 = np.where(single, left - w + width, right - w)
+    atoms = np.where(offs < width, left - w + offs, seg2 + offs - width)
+    valid = ~single | (offs < right - left + 2*w + 1)
+    seg1_end = np.where(single, right + w, left + w)
+
+    lo = int(left.min()) - w
+    hi = int(right.max()) + w + 1
+    p, twisted = bond_partners(prot, lo, hi)
+    k = np.clip(atoms - lo, 0, hi - lo - 1)
+    j = p[k]
+    central = (atoms == left) | (atoms == right)
+    bonded = valid & ~central & (j >= 0)
+    local = bonded & (((j >= left - w) & (j <= seg1_end)) |
+                      ((j >= right - w) & (j <= right + w)))
+    remote = bonded & ~local
+
+    # Local bonds get letters in the order of their first ends; the
+    # Hbonds from b on (a being the central one), the Tbonds from A on.
+    calpha = atoms % 3 == 1
+    opening = local & (j > atoms)
+    rank = np.where(calpha, np.cumsum(opening & calpha, axis=1) - 1,
+                    np.cumsum(opening & ~calpha, axis=1))
+    rows = np.arange(len(bonds))[:, None]
+    col = np.where(j <= seg1_end, j - (left - w), width + j - (right - w))
+    letter = np.where(opening, rank, rank[rows, np.where(local & ~opening, col, 0)])
+    # describe_raw_local_pattern runs out of letters for these.
+    overflow = (local & (letter >= 26)).any(axis=1).tolist()
+
+    mod3 = atoms % 3
+    char = np.choose(mod3, [ord(c) for c in isolated_char])
+    char = np.where(remote, np.choose(mod3, [ord(c) for c in remote_char]), char)
+    char = np.where(local, np.where(calpha, ord("A"), ord("a")) + letter, char)
+    char = np.where(central, ord("a"), char)
+    suffix = np.zeros(atoms.shape, dtype=np.int64)
+    suffix[local & twisted[k]] = 1
+    suffix[remote] = np.where(atoms < j, 2, 3)[remote]
+    suffix[central & prot.twisted[bid][:, None]] = 1
+    specs = (4*char + suffix).tolist()
+
+    single = single[:, 0].tolist()
+    length = (right - left + 2*w + 1)[:, 0].tolist()
+    starts = (left - w)[:, 0].tolist()
+    starts2 = seg2[:, 0].tolist()
+    for r, hb in enumerate(bonds):
+        if overflow[r]:
+            yield describe_raw_local_pattern(config, prot, hb)
+            continue
+        spec = [spec_strings[c] for c in specs[r]]
+        if single[r]:
+            yield ("a", spec[:length[r]], starts[r], None, None)
+        else:
+            yield ("a", spec[:width], starts[r], spec[width:], starts2[r])
+
+def raw_local_patterns(config, prot, bonds):
+    """Yield describe_raw_local_pattern(config, prot, bond) for each of
+    the Hbonds bonds; for an ArrayProtein, they are computed at once."""
+    if isinstance(prot, ArrayProtein):
+        return describe_raw_local_patterns(config, prot, bonds)
+    return (describe_raw_local_pattern(config, prot, hb) for hb in bonds)
+
+def char_column(d, lo, hi, default):
+    """Return a string of the values d[k] for lo <= k < hi, using
+    default for missing keys."""
+    a = np.empty(hi - lo, dtype="S1")
+    a.fill(default)
+    for k, v in d.iteritems():
+        if lo <= k < hi:
+            a[k - lo] = v
+    return a.tostring()
+
+
+
+
+# The records produced by the pattern generators below. residues is
+# the residue scheme followed by the simplified residues, or None
+# when residues are not shown; likewise for ssclasses.
+HbondPattern = collections.namedtuple(
+    'HbondPattern',
+    'protein line donor acceptor cluster length toptype residues')
+TbondPattern = collections.namedtuple(
+    'TbondPattern', 'protein line left right toptype')
+WindowPattern = collections.namedtuple(
+    'WindowPattern', 'protein start toptype residues ssclasses')
+
+
+def format_pattern(rec):
+    """Format a pattern record as a line of find_local_patterns.py output."""
+    if isinstance(rec, TbondPattern):
+        return "\t".join((rec.protein, str(rec.line), str(rec.left), str(rec.right), rec.toptype)) + "\n"
+    if isinstance(rec, HbondPattern):
+        s = "\t".join((rec.protein, str(rec.line), str(rec.donor), str(rec.acceptor), rec.cluster, rec.length, rec.toptype))
+        extra = (rec.residues,)
+    else:
+        s = "\t".join((rec.protein, str(rec.start), rec.toptype))
+        extra = (rec.residues, rec.ssclasses)
+    for e in extra:
+        if e is not None:
+            s += " \t" + e
+    return s + " \n"
+
+
+def hbond_pattern(config, prot, hb, toptype):
+    residues = None
+    if config.show_residues:
+        residues = str(config.residue_scheme) + simplify_residues(hb.residues, config.residue_scheme)
+    return HbondPattern(prot.name, hb.linenumber, hb.donor/3, (hb.accptr-2)/3,
+                        hb.nature_cluster(), hb.length_class(), toptype, residues)
+
+
+def hbond_patterns(prot, config, wl=()):
+    """Yield an HbondPattern for each Hbond of prot, skipping the line
+    numbers in wl."""
+    hbs = [hb for hb in prot.Hbonds if hb.linenumber not in wl]
+    for hb, raw in itertools.izip(hbs, raw_local_patterns(config, prot, hbs)):
+        yield hbond_pattern(config, prot, hb, normalized_toptype(config, *raw))
+
+
+def multi_hbond_patterns(prot, configs, wl=()):
+    """Like hbond_patterns, but for several configs at once. Yield
+    (k, pattern) pairs, where k is the index of the config in configs.
+    The raw pattern is only computed once per window size, and the
+    toptype once per set of options used by normalized_toptype."""
+    # Group the configs by window size, since the raw pattern only
+    # depends on that, and then by the options used by
+    # normalized_toptype; the residue scheme only matters when
+    # printing.
+    groups = collections.OrderedDict()
+    for k, c in enumerate(configs):
+        key = (c.nearby_remotes, c.nearby_twists, c.remote_sign, c.always_include_remotes)
+        groups.setdefault(c.window_size, collections.OrderedDict()).setdefault(key, []).append(k)
+
+    hbs = [hb for hb in prot.Hbonds if hb.linenumber not in wl]
+    raws = [raw_local_patterns(configs[ks.values()[0][0]], prot, hbs)
+            for ks in groups.itervalues()]
+    for hb in hbs:
+        for ks, raw in itertools.izip(groups.itervalues(), raws):
+            raw = raw.next()
+            for kl in ks.itervalues():
+                toptype = normalized_toptype(configs[kl[0]], *raw)
+                for k in kl:
+                    yield k, hbond_pattern(configs[k], prot, hb, toptype)
+
+
+def tbond_patterns(prot, config):
+    """Yield a TbondPattern for each tertiary interaction of prot."""
+    for tb in prot.Tbonds:
+        toptype = describe_local_pattern(config, prot, tb)
+        yield TbondPattern(prot.name, tb.linenumber, (tb.donor-1)/3, (tb.accptr-1)/3, toptype)
+
+
+def window_patterns(prot, config):
+    """Yield a WindowPattern for each window of config.acid_length
+    amino acids in prot."""
+    # Hm. Should we compute the actual pattern for the entire
+    # window, then strip the outermost 2*3*trim specifiers, or
+    # should we just compute the pattern for the central segment
+    # we're actually interested in? The former may give slightly
+    # more details (presence of an 'a' or 'b' without a buddy
+    # would indicate a 'short' bond), but at the same time it
+    # would complicate interpreting these patterns. Moreover, when
+    # we include 'remote signs', we would miss the direction of
+    # those 'a' and 'b' bonds. So for now, we use the latter
+    # option.
+    acid_length = config.acid_length
+    trim_size = config.trim_size
+    starts = xrange(prot.minidx//3, max(prot.maxidx//3 - acid_length + 1, prot.minidx//3) + 1)
+    # toptypes = describe_pattern_windows(config, prot, starts, acid_length, trim_size)
+    toptypes = describe_pattern_windows(config, prot, [start+trim_size for start in starts], acid_length-2*trim_size)
+    lo = starts[0]
+    hi = starts[-1] + acid_length
+    if config.show_residues:
+        residues = char_column(prot.residues, lo, hi, "X")
+    if config.show_ssclass:
+        ssclasses = char_column(prot.ssclass, lo, hi, "-")
+    for start, toptype in itertools.izip(starts, toptypes):
+        k = start - lo
+        r = None
+        ss = None
+        if config.show_residues:
+            r = residues[k:k+acid_length]
+        if config.show_ssclass:
+            ss = ssclasses[k:k+acid_length]
+        yield WindowPattern(prot.name, start, toptype, r, ss)
+
+
+def load_protein(f, prot_store=None, array_protein=False, tert_dir=None,
+                 residue_dir=None, ssclass_dir=None):
+    """Read the protein in file f, or from prot_store if it is there,
+    along with the optional tertiary, residue and secondary structure
+    information."""
+    base, ext = os.path.splitext(os.path.basename(f))
+    if array_protein:
+        prot = ArrayProtein(name = base)
+    else:
+        prot = Protein(name = base)
+    if prot_store is not None and base in prot_store:
+        prot.from_store(prot_store)
+    else:
+        prot.from_file(f)
+
+    if tert_dir:
+        tfile = tert_dir + "/" + os.path.basename(f)
+        try:
+            prot.add_tertiary_interactions(tfile)
+        except Exception as e:
+            pass
+            # sys.stderr.write("Failed to add tertiary interaction info for %s: %s\n" % (base, e))
+
+    if residue_dir:
+        resfile = residue_dir + "/" + os.path.basename(f)
+        prot.add_residue_information(resfile)
+
+    if ssclass_dir:
+        ssfile = ssclass_dir + "/" + os.path.basename(f)
+        prot.add_ssclass_information(ssfile)
+
+    return prot
+
+
+def describe_protein(prot, configs, multi=False, wl=(), tbonds=False):
+    """Return the output for prot as a list of strings, one for each
+    of configs. With multi, the Hbonds are described once for each of
+    configs (see multi_hbond_patterns); otherwise there must be just
+    one config, used as by the command line tool."""
+    if multi:
+        texts = [[] for c in configs]
+        for k, rec in multi_hbond_patterns(prot, configs, wl):
+            texts[k].append(format_pattern(rec))
+        return ["".join(t) for t in texts]
+
+    config, = configs
+    if config.acid_length > 0:
+        patterns = window_patterns(prot, config)
+    elif tbonds:
+        patterns = tbond_patterns(prot, config)
+    else:
+        patterns = hbond_patterns(prot, config, wl)
+    return ["".join(format_pattern(rec) for rec in patterns)]
+
+
+def protein_size(f, prot_store=None):
+    """The number of lines of the protein in file f, or the size of
+    the file if it is not in prot_store. Only used to balance the work
+    between processes."""
+    base = os.path.splitext(os.path.basename(f))[0]
+    if prot_store is not None and base in prot_store:
+        s = prot_store.rows(base)
+        return (s.stop - s.start) * 256
+    return os.path.getsize(f)
+
+
+# State of a worker process in describe_files, set by _init_worker.
+_worker_args = None
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args
+
+def _describe_file(f):
+    configs, multi, whitelist, tbonds, load_args = _worker_args
+    prot = load_protein(f, **load_args)
+    return describe_protein(prot, configs, multi, whitelist.get(prot.name, ()), tbonds)
+
+
+def describe_files(files, configs, multi=False, whitelist={}, tbonds=False,
+                   jobs=1, **kwargs):
+    """For each of files, in order, yield the output of
+    describe_protein. The remaining keyword arguments are passed on to
+    load_protein.
+
+    With jobs > 1, the proteins are described by a pool of jobs
+    processes. They are handed out largest first, so that the
+    processes finish at about the same time, but the results are still
+    yielded in the order of files."""
+    if jobs <= 1 or len(files) <= 1:
+        _init_worker(configs, multi, whitelist, tbonds, kwargs)
+        for f in files:
+            yield _describe_file(f)
+        return
+
+    import multiprocessing
+    prot_store = kwargs.get('prot_store')
+    order = sorted(xrange(len(files)),
+                   key=lambda k: -protein_size(files[k], prot_store))
+    pool = multiprocessing.Pool(jobs, _init_worker,
+                                (configs, multi, whitelist, tbonds, kwargs))
+    try:
+        results = [None] * len(files)
+        for k in order:
+            results[k] = pool.apply_async(_describe_file, (files[k],))
+        for k in xrange(len(files)):
+            yield results[k].get()
+            results[k] = None
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def write_patterns(files, config, out, whitelist={}, tbonds=False, jobs=1,
+                   **kwargs):
+    """Describe the proteins in files, writing to out as the command
+    line tool does. The remaining keyword arguments are passed on to
+    load_protein."""
+    for text, in describe_files(files, [config], False, whitelist, tbonds,
+                                jobs, **kwargs):
+        out.write(text)
+
+
+def write_multi_patterns(files, configs, outs, whitelist={}, jobs=1, **kwargs):
+    """Describe the Hbonds of the proteins in files once for each of
+    configs, writing the output for configs[k] to outs[k]."""
+    for texts in describe_files(files, configs, True, whitelist, False,
+                                jobs, **kwargs):
+        for out, text in zip(outs, texts):
+            out.write(text)
+
+
+def option_parser():
+    from argparse import ArgumentParser
+    parser = ArgumentParser()
 
+    parser.add_argument("files", nargs='*')
 
-# sys.stdout = open("out/local_pattern.txt_%s_%d" % (hostname, pid), "w")
+    parser.add_argument("--output", help="output file")
 
-from argparse import ArgumentParser
-parser = ArgumentParser()
+    parser.add_argument("--window-size", type=int,
+                        help="the window size (in atoms) to use on either side of each H-bond", metavar="SIZE",
+                        default=3)
 
-parser.add_argument("files", nargs='*')
+    parser.add_argument("--nearby-remotes", type=int,
+                        help="the number of N/O atoms around the primary bond at which to retain remote bond information", metavar="COUNT",
+                        default=2)
 
-parser.add_argument("--output", help="output file")
+    parser.add_argument("--nearby-twists", type=int,
+                        help="the number of N/O atoms around the primary bond at which to retain twist information", metavar="COUNT",
+                        default=-1)
 
-parser.add_argument("--window-size", type=int,
-                    help="the window size (in atoms) to use on either side of each H-bond", metavar="SIZE",
-                    default=window_size)
+    parser.add_argument("--remote-sign", action="store_true",
+                        help="whether to include forward/backward information (+/-) for remote bonds (r or R) (default %(default)s)")
 
-parser.add_argument("--nearby-remotes", type=int,
-                    help="the number of N/O atoms around the primary bond at which to retain remote bond information", metavar="COUNT",
-                    default=nearby_remotes)
+    parser.add_argument("--always-include-remotes", action="store_true",
+                        help="whether to include remote bonds even if there is at least one other 'local' H-bond (default %(default)s)")
 
-parser.add_argument("--nearby-twists", type=int,
-                    help="the number of N/O atoms around the primary bond at which to retain twist information", metavar="COUNT",
-                    default=nearby_twists)
+    parser.add_argument("--tert-dir", type=str,
+                        help="directory containing tertiary interaction information")
 
-parser.add_argument("--remote-sign", action="store_true",
-                    help="whether to include forward/backward information (+/-) for remote bonds (r or R) (default %(default)s)")
+    parser.add_argument("--Tbonds", action="store_true",
+                        help="whether to describe tertiary interactions (T-bonds) rather than H-bonds (default %(default)s). Meaningless without --tert-dir.")
 
-parser.add_argument("--always-include-remotes", action="store_true",
-                    help="whether to include remote bonds even if there is at least one other 'local' H-bond (default %(default)s)")
+    parser.add_argument("--show-residues", action="store_true",
+                        help="whether to include a column with the four residues around N/O (default %(default)s)", default=True)
 
-parser.add_argument("--tert-dir", type=str,
-                    help="directory containing tertiary interaction information")
+    parser.add_argument("--residue-scheme", type=int,
+                        help="which scheme to use for grouping residues", metavar="IDX",
+                        default=0)
 
-parser.add_argument("--Tbonds", action="store_true",
-                    help="whether to describe tertiary interactions (T-bonds) rather than H-bonds (default %(default)s). Meaningless without --tert-dir.")
+    parser.add_argument("--show-ssclass", action="store_true",
+                        help="whether to include a column with the four secondary structure classifications around N/O (default %(default)s)")
 
-parser.add_argument("--show-residues", action="store_true",
-                    help="whether to include a column with the four residues around N/O (default %(default)s)", default=True)
 
-parser.add_argument("--residue-scheme", type=int,
-                    help="which scheme to use for grouping residues", metavar="IDX",
-                    default=residue_scheme)
+    parser.add_argument("--acid-length", type=int,
+                        help="describe all patterns in a sliding window of this size, instead of around each Hbond", metavar="LENGTH",
+                        default=0)
 
-parser.add_argument("--show-ssclass", action="store_true",
-                    help="whether to include a column with the four secondary structure classifications around N/O (default %(default)s)")
+    parser.add_argument("--trim-size", type=int, default=0,
+                        help="trim this many amino acids from either end of the printed pattern when in sliding window mode")
 
+    parser.add_argument("--residue-dir", type=str,
+                        help="directory containing residue information")
 
-parser.add_argument("--acid-length", type=int,
-                    help="describe all patterns in a sliding window of this size, instead of around each Hbond", metavar="LENGTH",
-                    default=0)
+    parser.add_argument("--ssclass-dir", type=str,
+                        help="directory containing secondary structure information")
 
-parser.add_argument("--trim-size", type=int, default=0,
-                    help="trim this many amino acids from either end of the printed pattern when in sliding window mode")
+    parser.add_argument("--whitelist", type=str, action='append',
+                        help="file(s) with list of protein/line number pairs of Hbonds to ignore")
 
-parser.add_argument("--residue-dir", type=str,
-                    help="directory containing residue information")
+    parser.add_argument("--prot-store", type=str,
+                        help="protein store created by protstore.py; proteins found there are not read from their files")
 
-parser.add_argument("--ssclass-dir", type=str,
-                    help="directory containing secondary structure information")
+    parser.add_argument("--opts-file", type=str, action='append',
+                        help="option file(s), as created by create_opts.py; describe the Hbonds once for each of them, in a single pass over the files, writing the output for stepN_opts to OUTPUT_DIR/stepN/flp.txt (appending)")
 
-parser.add_argument("--whitelist", type=str, action='append',
-                    help="file(s) with list of protein/line number pairs of Hbonds to ignore")
+    parser.add_argument("--output-dir", type=str, default=".",
+                        help="output directory used with --opts-file (default %(default)s)")
 
-args = parser.parse_args()
+    parser.add_argument("--array-protein", action="store_true",
+                        help="whether to keep the Hbonds of each protein in NumPy arrays (protarray.ArrayProtein) instead of Hbond objects (default %(default)s)")
 
-window_size = args.window_size
-nearby_remotes = args.nearby_remotes
-nearby_twists = args.nearby_twists
-remote_sign = args.remote_sign
-always_include_remotes = args.always_include_remotes
-tert_dir = args.tert_dir
-Tbonds = args.Tbonds
-show_residues = args.show_residues
-show_ssclass = args.show_ssclass
-residue_scheme = args.residue_scheme
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="number of processes describing proteins in parallel; the output is the same as with one (default %(default)s)")
 
-acid_length = args.acid_length
-residue_dir = args.residue_dir
-ssclass_dir = args.ssclass_dir
-trim_size = args.trim_size
-whitelist_files = args.whitelist
-if whitelist_files is None:
-    whitelist_files = []
-whitelist = read_whitelist_files(whitelist_files)
+    return parser
+
+
+def open_step_output(optsf, output_dir):
+    """Open (for appending) output_dir/stepN/flp.txt for the option
+    file stepN_opts."""
+    step = os.path.basename(optsf).split('_')[0]
+    stepdir = os.path.join(output_dir, step)
+    if not os.path.isdir(stepdir):
+        os.makedirs(stepdir)
+    return open(os.path.join(stepdir, "flp.txt"), "a")
 
-if args.output:
-    sys.stdout = open(args.output, "w")
 
 # For acid_length > 0, the --show-residues, --always-include-remotes and --remote-sign options also have meaning.
 
@@ -519,66 +1035,42 @@ if args.output:
 # if not residue_dir:
 #     residue_dir = "/home/qgm/QGM/cdp/data/20150428/HQ60"
 
-
-for f in args.files:
-    base, ext = os.path.splitext(os.path.basename(f))
-    prot = Protein(name = base)
-    prot.from_file(f)
-
-    if base in whitelist:
-        wl = whitelist[base]
+def main(argv=None):
+    parser = option_parser()
+    args = parser.parse_args(argv)
+
+    config = PatternConfig.from_args(args)
+    whitelist_files = args.whitelist
+    if whitelist_files is None:
+        whitelist_files = []
+    whitelist = read_whitelist_files(whitelist_files)
+    prot_store = None
+    if args.prot_store:
+        prot_store = ProteinStore(args.prot_store)
+    load_args = dict(prot_store = prot_store, array_protein = args.array_protein,
+                     tert_dir = args.tert_dir, residue_dir = args.residue_dir,
+                     ssclass_dir = args.ssclass_dir)
+
+    out = sys.stdout
+    if args.output:
+        out = open(args.output, "w")
+
+    # With --opts-file, the pattern options are taken from each of the
+    # files instead of the command line.
+    if args.opts_file:
+        if args.acid_length > 0 or args.Tbonds:
+            parser.error("--opts-file cannot be combined with --acid-length or --Tbonds")
+        configs = [PatternConfig.from_opts_file(optsf) for optsf in args.opts_file]
+        outs = [open_step_output(optsf, args.output_dir) for optsf in args.opts_file]
+        write_multi_patterns(args.files, configs, outs, whitelist, args.jobs, **load_args)
+        for o in outs:
+            o.close()
     else:
-        wl = set()
+        write_patterns(args.files, config, out, whitelist, args.Tbonds, args.jobs, **load_args)
 
-    if tert_dir:
-        tfile = tert_dir + "/" + os.path.basename(f)
-        try:
-            prot.add_tertiary_interactions(tfile)
-        except Exception as e:
-            pass
-            # sys.stderr.write("Failed to add tertiary interaction info for %s: %s\n" % (base, e))
-
-    if residue_dir:
-        resfile = residue_dir + "/" + os.path.basename(f)
-        prot.add_residue_information(resfile)
+    if out is not sys.stdout:
+        out.close()
 
-    if ssclass_dir:
-        ssfile = ssclass_dir + "/" + os.path.basename(f)
-        prot.add_ssclass_information(ssfile)
 
-    if acid_length > 0:
-        # Hm. Should we compute the actual pattern for the entire
-        # window, then strip the outermost 2*3*trim specifiers, or
-        # should we just compute the pattern for the central segment
-        # we're actually interested in? The former may give slightly
-        # more details (presence of an 'a' or 'b' without a buddy
-        # would indicate a 'short' bond), but at the same time it
-        # would complicate interpreting these patterns. Moreover, when
-        # we include 'remote signs', we would miss the direction of
-        # those 'a' and 'b' bonds. So for now, we use the latter
-        # option.
-
-        for start in xrange(prot.minidx//3, max(prot.maxidx//3 - acid_length + 1, prot.minidx//3) + 1):
-            # toptype = describe_pattern_window(prot, start, acid_length, trim_size)
-            toptype = describe_pattern_window(prot, start+trim_size, acid_length-2*trim_size)
-            print "\t".join((prot.name, str(start), toptype)),
-            if show_residues:
-                print "\t" + prot.get_residues(start, acid_length),
-            if show_ssclass:
-                print "\t" + prot.get_ssclasses(start, acid_length),
-            print "\n",
-
-    elif Tbonds:
-        for tb in prot.Tbonds:
-            toptype = describe_local_pattern(prot, tb)
-            print "\t".join((prot.name, str(tb.linenumber), str((tb.donor-1)/3), str((tb.accptr-1)/3), toptype))
-    else:
-        for hb in prot.Hbonds:
-            if hb.linenumber in wl:
-                continue
-            toptype = describe_local_pattern(prot, hb)
-            print "\t".join((prot.name, str(hb.linenumber), str(hb.donor/3), str((hb.accptr-2)/3), hb.nature_cluster(), hb.length_class(), toptype)),
-            if show_residues:
-                print "\t" + str(residue_scheme) + simplify_residues(hb.residues),
-            print "\n",
-                
+if __name__ == '__main__':
+    main()
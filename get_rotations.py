@@ -4,7 +4,8 @@
 #
 # Time-stamp: <2016-05-27 09:45:04 au447708>
 #
-# usage: get_rotations.py [-h] input outdir prot_dir
+# usage: get_rotations.py [-h] [-j JOBS] [--prot-store PROT_STORE]
+#                         input outdir prot_dir
 #
 # Get rotation vector for each bond in input file. Output is one file
 # per bond description.
@@ -16,6 +17,11 @@
 #
 # optional arguments:
 #   -h, --help       show this help message and exit
+#   -j JOBS, --jobs JOBS
+#                    Number of processes reading protein files.
+#   --prot-store PROT_STORE
+#                    Protein store created by protstore.py; proteins
+#                    found there are not read from their files.
 #
 # Author: Yuki Koyanagi
 # History:
@@ -27,46 +33,145 @@
 #  2016/05/19: yk: Added residue info to the output
 #  2016/05/27: yk: Include distance in output. Remove file ext
 #  from output.
+#  2026/10/18: Read each protein file once, rather than once per bond.
+#  Added --jobs and --prot-store.
 
 
 import argparse
+import collections
+import itertools
+import os
 
 
-def get_rotations(input, outdir, prot_dir):
+class RotationWriter:
     """
+    Writes rotations to one file per bond description, in outdir,
+    one rotation per line (with no newline after the last). At most
+    max_open files are kept open at a time.
     """
-    # Build list of bonds from input
+
+    def __init__(self, outdir, max_open=128):
+        self.outdir = outdir
+        self.max_open = max_open
+        self.files = collections.OrderedDict()
+        self.written = set()
+
+    def write(self, desc, rot):
+        f = self.files.pop(desc, None)
+        if f is None:
+            if len(self.files) >= self.max_open:
+                self.files.popitem(last=False)[1].close()
+            mode = 'a' if desc in self.written else 'w'
+            f = open('{}/{}'.format(self.outdir, desc), mode)
+        self.files[desc] = f
+        if desc in self.written:
+            f.write('\n')
+        else:
+            self.written.add(desc)
+        f.write('{}\t{}\t{}\t{}'.format(rot[0], rot[1], rot[2], rot[3]))
+
+    def close(self):
+        for f in self.files.itervalues():
+            f.close()
+        self.files.clear()
+
+
+def read_rotations(prot_file, l_nums):
+    """
+    Return dict {line number: rotation} for the line numbers in
+    l_nums (a set of ints) of prot_file, reading it once. Line numbers
+    beyond the end of the file are left out.
+    """
+    # Assumes rotation vectors are in cols 16-19.
+    rots = dict()
+    last = max(l_nums)
+    with open(prot_file) as p:
+        for i, line in enumerate(p):
+            if i+1 in l_nums:
+                cols = line.split()
+                rots[i+1] = (cols[15], cols[16], cols[17], cols[18])
+            if i+1 >= last:
+                break
+    return rots
+
+
+def _read_rotations(args):
+    return read_rotations(*args)
+
+
+def get_rotations(input, outdir, prot_dir, jobs=1, prot_store=None):
+    """
+    Write the rotation of each bond in input to the file for its bond
+    description in outdir. Each protein file is read once; the proteins
+    are read by jobs processes if jobs > 1, or taken from prot_store
+    (a protstore.ProteinStore) if they are there.
+    """
+    # Build list of bonds from input, and the line numbers needed
+    # from each protein, in order of first appearance.
     bonds = []
+    l_nums = collections.OrderedDict()
     with open(input) as f:
         for line in f:
             cols = line.split()
             protein = cols[0]
-            l_num = cols[1]
+            l_num = int(cols[1])
             dist = cols[5]
             pattern = cols[6]
             residue = cols[7]
-            bonds.append((protein, l_num, dist, pattern, residue))
+            bonds.append((protein, l_num,
+                          '{}_{}_{}'.format(pattern, dist, residue)))
+            l_nums.setdefault(protein, set()).add(l_num)
 
-    # Build dict (protein:list of rotations) from list.
-    # Assumes rotation vectors are in cols 16-19.
-    rotations = dict()
-    for protein, l_num, dist, pattern, residue in bonds:
-        with open('{}/{}.txt'.format(prot_dir, protein)) as p:
-            for i, line in enumerate(p):
-                if i == int(l_num)-1:
-                    cols = line.split()
-                    rot = (cols[15], cols[16], cols[17], cols[18])
-                    desc = '{}_{}_{}'.format(pattern, dist, residue)
-                    if desc in rotations:
-                        rotations[desc].append(rot)
-                    else:
-                        rotations[desc] = [rot]
-
-    for vs in rotations.iteritems():
-        with open('{}/{}'.format(outdir, vs[0]), 'w') as o:
-            o.write('\n'.join(
-                '{}\t{}\t{}\t{}'.format(v[0], v[1], v[2], v[3])
-                for v in vs[1]))
+    # The index of the last bond of each protein, after which its
+    # rotations can be dropped.
+    last = dict((b[0], k) for k, b in enumerate(bonds))
+
+    def from_store(protein):
+        rots = prot_store.rotation_strings(protein)
+        return dict((n, rots[n-1]) for n in l_nums[protein]
+                    if n <= len(rots))
+
+    def from_files(proteins):
+        return (('{}/{}.txt'.format(prot_dir, p), l_nums[p])
+                for p in proteins)
+
+    proteins = list(l_nums)
+    pool = None
+    if prot_store is not None:
+        proteins = [p for p in proteins if p not in prot_store]
+    if jobs > 1 and len(proteins) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(_read_rotations, from_files(proteins))
+    else:
+        results = itertools.imap(_read_rotations, from_files(proteins))
+    results = itertools.izip(proteins, results)
+
+    writer = RotationWriter(outdir)
+    try:
+        rotations = dict()
+        for k, (protein, l_num, desc) in enumerate(bonds):
+            if protein not in rotations:
+                if prot_store is not None and protein in prot_store:
+                    rotations[protein] = from_store(protein)
+                else:
+                    # Results come in order of first appearance, so
+                    # this is the next one.
+                    p, rots = results.next()
+                    assert p == protein
+                    rotations[protein] = rots
+            rot = rotations[protein].get(l_num)
+            if rot is not None:
+                writer.write(desc, rot)
+            if last[protein] == k:
+                del rotations[protein]
+        writer.close()
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
 
 
 if __name__ == '__main__':
@@ -78,5 +183,16 @@ if __name__ == '__main__':
     parser.add_argument('outdir', help='Output file directory.')
     parser.add_argument('prot_dir', help='Directory containing '
                         'original protein data.')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes reading protein '
+                        'files.')
+    parser.add_argument('--prot-store', help='Protein store created '
+                        'by protstore.py; proteins found there are not '
+                        'read from their files.')
     args = parser.parse_args()
-    get_rotations(args.input, args.outdir, args.prot_dir)
+    prot_store = None
+    if args.prot_store:
+        from protstore import ProteinStore
+        prot_store = ProteinStore(args.prot_store)
+    get_rotations(args.input, args.outdir, args.prot_dir, args.jobs,
+                  prot_store)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#
+# File: improve_modebox.py
+#
+# Time-stamp: <>
+#
+# usage: improve_modebox.py [-h] label [label ...]
+#
+# Python version of improve_modebox.pl. For a single cluster, moves
+# the mode box to the box (found by hill climbing in the 5x5x5
+# neighbourhood) minimizing the sum of squared SO(3) distances to the
+# (magic rotated) observations in {label}, and writes the updated
+# {label}_Summary2.txt; otherwise {label}_Summary.txt is copied. The
+# distances from all observations to all candidate boxes of a step
+# are computed at once, with the arithmetic done in the same order as
+# in the Perl script, so that the output is the same.
+#
+# positional arguments:
+#   label       Rotation file; {label}_Summary.txt is the clustering
+#               summary.
+#
+# optional arguments:
+#   -h, --help  show this help message and exit
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: Use so3.py for the rotation math
+#
+
+import argparse
+import math
+import shutil
+
+import numpy as np
+
+import so3
+
+names = ('id', 'bx', 'by', 'bz', 'mode', 'obs_cluster', 'obs_-cluster',
+         'box_cluster', 'box_-cluster',
+         'density_mode', 'sum_dens_cluster', 'sum_dens_-cluster',
+         'vol_cluster', 'vol_-cluster',
+         'mean_dist_mode', 'max_dist_mode',
+         'peak_cluster',
+         'mean_dist_all_mode', 'max_dist_all_mode',
+         'peak_all')
+
+# Observations per block when computing distances.
+block = 8192
+
+
+def idx_to_coord(w):
+    """The middle of box w (1..81)."""
+    return -math.pi + (2*math.pi*(np.asarray(w) - 0.5))/81
+
+
+def do_magic_rotation(rot):
+    """The magic rotated matrices of the rotations rot (n x 4)."""
+    rot = np.asarray(rot, dtype=np.float64).reshape((-1, 4))
+    n = so3.norm(rot[:, :3])
+    return so3.magic_rotation(
+        so3.axis_angle_to_matrix(rot[:, :3]/n[:, None], rot[:, 3]*n))
+
+
+def so3_distances(cand, obs):
+    """SO3_distance for each candidate matrix (m x 3 x 3) and
+    observation (n x 3 x 3), as an n x m array."""
+    t = so3.trace_products(cand[None], obs[:, None])
+    return so3.acos_real((t - 1)/2)
+
+
+def total_distances(obs, cand, squared):
+    """Sum over obs of the (squared) distances to each of cand, adding
+    the observations one by one, in order."""
+    if len(cand) == 1:
+        # A single column would be summed pairwise.
+        return total_distances(obs, np.vstack((cand, cand)), squared)[:1]
+    total = np.zeros(len(cand))
+    for s in xrange(0, len(obs), block):
+        d = so3_distances(cand, obs[s:s+block])
+        if squared:
+            d = d**2
+        # Reducing along the first axis adds row by row.
+        total = np.add.reduce(np.vstack((total, d)), axis=0)
+    return total
+
+
+def find_best(b, obs):
+    """Hill climb from box b; returns (bx, by, bz, mean distance)."""
+    b = tuple(b)
+    dist = total_distances(obs, so3.ev_to_matrix(idx_to_coord([b])), True)[0]
+    visited = set()
+    offsets = [(dx, dy, dz) for dx in xrange(-2, 3)
+               for dy in xrange(-2, 3) for dz in xrange(-2, 3)]
+    while True:
+        cand = []
+        for dx, dy, dz in offsets:
+            c = (b[0] + dx, b[1] + dy, b[2] + dz)
+            if c in visited:
+                continue
+            visited.add(c)
+            coord = idx_to_coord(c)
+            # If we've gone outside the sphere of radius pi, ignore
+            # this 'box'.
+            if math.sqrt(sum(x*x for x in coord)) >= math.pi:
+                continue
+            cand.append(c)
+        if not cand:
+            break
+        d = total_distances(obs, so3.ev_to_matrix(idx_to_coord(cand)), True)
+        k = np.argmin(d)
+        if not d[k] < dist:
+            break
+        b = cand[k]
+        dist = d[k]
+    mean = total_distances(obs, so3.ev_to_matrix(idx_to_coord([b])),
+                           False)[0]/len(obs)
+    return b[0], b[1], b[2], mean
+
+
+def read_observations(fn):
+    with open(fn) as f:
+        rot = np.array(f.read().split(), dtype=np.float64)
+    return do_magic_rotation(rot)
+
+
+def improve_modebox(label):
+    summary_file = label + '_Summary.txt'
+    summary_file2 = label + '_Summary2.txt'
+    with open(summary_file) as f:
+        lines = f.read().splitlines()
+    if len(lines) != 1:
+        # We only attempt to do something when a single cluster has
+        # been found.
+        shutil.copy(summary_file, summary_file2)
+        return
+    fields = dict(zip(names, lines[0].split('\t')))
+
+    obs = read_observations(label)
+    b = [int(float(fields[k])) for k in ('bx', 'by', 'bz')]
+    bx, by, bz, best = find_best(b, obs)
+    if [bx, by, bz] == b:
+        # No change, no need to do anything.
+        shutil.copy(summary_file, summary_file2)
+        return
+
+    # Update the bx,by,bz,mean_dist_all_mode fields and clear out the
+    # fields which are certainly meaningless when we modify the 'mode'
+    # box.
+    fields['bx'], fields['by'], fields['bz'] = str(bx), str(by), str(bz)
+    fields['mean_dist_all_mode'] = '%.15g' % best
+    for k in ('mode', 'density_mode', 'mean_dist_mode', 'max_dist_mode',
+              'max_dist_all_mode'):
+        fields[k] = '0'
+    with open(summary_file2, 'w') as f:
+        f.write('\t'.join(fields.get(k, '') for k in names) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Move the mode box of single clusters to the box '
+        'closest to the observations.')
+    parser.add_argument('label', nargs='+', help='Rotation file; '
+                        '{label}_Summary.txt is the clustering summary.')
+    args = parser.parse_args()
+    for label in args.label:
+        improve_modebox(label)
@@ -3,6 +3,7 @@
 tar cjf cdp.tar.bz2 \
     cdp_opts.sh cdp.py cluster_with_opts.py \
     evaluate_clustering.pl filter_bonds.py \
-    find_local_patterns.py get_rotations.py \
-    improve_modebox.pl run_cluster.py \
-    Rasmus2.r StartClustSubsetVers4.txt
+    find_local_patterns.py get_rotations.py protstore.py protarray.py \
+    so3.py rpool.py clustcache.py \
+    improve_modebox.pl improve_modebox.py run_cluster.py \
+    Rasmus2.r cluster_worker.r StartClustSubsetVers4.txt
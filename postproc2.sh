@@ -8,12 +8,15 @@
 #
 # Author: Yuki Koyanagi
 # History:
+#  2026-10-18: Use predict_rotation.py
+#  2026-10-18: Write report_abc.txt with evaluate_predictions.py
 #
 
-./predict_rotation --dir=assess2/ test/* > prediction_abc.txt
+./predict_rotation.py --dir=assess2/ --jobs 8 test/* > prediction_abc.txt
 cut -f 4 prediction_abc.txt \
     | ./getstat.py -t so3 > stat_out200_so3_abc.txt
 awk '$7=="L" {print $4}' prediction_abc.txt \
     | ./getstat.py -t so3 > stat_L_out200_so3_abc.txt
 awk '$7!="L" {print $4}' prediction_abc.txt \
     | ./getstat.py -t so3 > stat_nonL_out200_so3_abc.txt
+./evaluate_predictions.py prediction_abc.txt > report_abc.txt
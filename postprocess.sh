@@ -9,12 +9,16 @@
 #
 # Usage: ./postprocess.sh [path to tar file]
 #
-# Output: prediction.txt, stat_*.txt files in the same dir as
-#  the input tar file.
+# Output: prediction.txt, stat_*.txt and report.txt files in the same
+#  dir as the input tar file.
 #
 # Author: Yuki Koyanagi
 # History:
 #  2017-01-25: Updated for use with Abacus output files
+#  2026-10-18: Use predict_rotation.py, which describes the test
+#   proteins in-process instead of running find_local_patterns.py
+#   for every step.
+#  2026-10-18: Write report.txt with evaluate_predictions.py
 #
 
 if [ $# -eq 0 ]
@@ -30,16 +34,23 @@ mkdir assess
 
 tar xjf $tarfile -C assess
 
-ln -s ~/grendel/predict_rotation .
+ln -s ~/grendel/predict_rotation.py .
+ln -s ~/grendel/assessstore.py .
+ln -s ~/grendel/evaluate_predictions.py .
 ln -s ~/grendel/find_local_patterns.py .
 ln -s ~/grendel/cdp.py .
+ln -s ~/grendel/protstore.py .
+ln -s ~/grendel/protarray.py .
+ln -s ~/grendel/so3.py .
+ln -s ~/grendel/improve_modebox.py .
 ln -s ~/grendel/test .
 ln -s ~/grendel/getstat.py .
 
-./predict_rotation --dir=assess/ test/* > prediction.txt
+./predict_rotation.py --dir=assess/ --jobs 8 test/* > prediction.txt
 cut -f 4 prediction.txt \
     | ./getstat.py -t so3 > stat_out200_so3.txt
 awk '$7=="L" {print $4}' prediction.txt \
     | ./getstat.py -t so3 > stat_L_out200_so3.txt
 awk '$7!="L" {print $4}' prediction.txt \
     | ./getstat.py -t so3 > stat_nonL_out200_so3.txt
+./evaluate_predictions.py prediction.txt > report.txt
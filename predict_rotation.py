@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+#
+# File: predict_rotation.py
+#
+# Time-stamp: <>
+#
+# usage: predict_rotation.py [-h] --dir DIR [--protfile PROTFILE]
+#                            [--min-quality Q] [--min-window W]
+#                            [--max-window W] [--res-scheme SCHEMES]
+#                            [--min-twist T] [--max-twist T]
+#                            [--extreme-remotes] [--prot-store STORE]
+#                            [--array-protein] [--jobs N]
+#                            [--steps-per-pass N] [--no-prune] [--debug]
+#                            [protein [protein ...]]
+#
+# Python version of predict_rotation. For each Hbond of the proteins,
+# guesses the rotation by the pattern of highest quality over all
+# steps, as given by the stepN_assess files in DIR (or the store
+# compiled from them by assessstore.py), and prints the same columns
+# as predict_rotation: protein, line number, quality, SO(3) distance
+# between the guess and the actual rotation, the guess as an Euler
+# vector, pattern, length and step. Instead of running
+# find_local_patterns.py on all proteins for every step, the proteins
+# are read once and the patterns of a pass of steps are described at
+# once (see find_local_patterns.multi_hbond_patterns). The
+# arithmetic is done as in the Perl script, so that the output is the
+# same.
+#
+# The steps are visited in order of their highest quality, and an
+# Hbond is no longer described once no remaining step can give it a
+# better guess (or one of at least --min-quality), nor is a protein
+# all of whose Hbonds are settled; --no-prune visits all steps in
+# order, for every Hbond.
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: Prune steps by their highest quality
+#
+
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+import find_local_patterns
+import so3
+from assessstore import matrix_to_ev, mode_matrices, open_assessments
+
+# The guess for Hbonds no pattern has been assessed for
+no_guess = (-1, -1, '?', '?', None)
+
+# protein, line number, quality, distance, guess, pattern, length, step
+line_format = '%s\t%d\t%.4f\t%f\t%s\t%s\t%s\t%d\n'
+
+
+def dbg(debug, fmt, *args):
+    if debug:
+        sys.stderr.write('{}\t{}\n'.format(time.ctime(), fmt % args))
+
+
+def accept_options(opts, args):
+    """Whether to use a step with the find_local_patterns options
+    opts, according to --min-window, --res-scheme etc. in args."""
+    m = re.search(r'--window-size\s+([0-9]+)', opts)
+    if m and not args.min_window <= int(m.group(1)) <= args.max_window:
+        return False
+    m = re.search(r'--nearby-twists\s+(-?[0-9]+)', opts)
+    if m and not args.min_twist <= int(m.group(1)) <= args.max_twist:
+        return False
+    m = re.search(r'--residue-scheme\s+([0-9]+)', opts)
+    if args.res_scheme is not None and m and \
+            not re.search(m.group(1), args.res_scheme):
+        return False
+    m = re.search(r'--window-size\s+([0-9]+)', opts)
+    if args.extreme_remotes and m and \
+            not (re.search(r'--nearby-remotes\s+' + m.group(1), opts) or
+                 '--nearby-remotes 0' in opts):
+        return False
+    return True
+
+
+def pattern_config(opts):
+    o = find_local_patterns.option_parser().parse_args(opts.split())
+    if o.acid_length or o.Tbonds or o.tert_dir or o.residue_dir or \
+            o.ssclass_dir or o.whitelist:
+        raise ValueError('Unsupported pattern options: ' + opts)
+    return find_local_patterns.PatternConfig.from_args(o)
+
+
+def better(a, b):
+    """Whether guess a replaces guess b, as when going through the
+    steps in order and keeping the first one of highest quality."""
+    return a[0] > b[0] or (a[0] == b[0] and a[1] < b[1])
+
+
+def settled(guess, head, min_quality):
+    """Whether the output for an Hbond with guess (None if it has none
+    yet) stays the same, whatever the steps from head on give it; head
+    is (bound, step) of the next step in bound_order."""
+    return head[0] < min_quality or \
+        (guess is not None and not better(head, guess))
+
+
+# The proteins, the Hbonds to skip and the steps of the current pass,
+# set before forking the worker processes.
+_prots = []
+_skip = []
+_tables = []
+
+
+def protein_guesses(prot, tables, skip=()):
+    """{line number: guess} for the Hbonds of prot having a pattern in
+    tables, a list of (config, table), except the line numbers in
+    skip."""
+    best = {}
+    for k, rec in find_local_patterns.multi_hbond_patterns(
+            prot, [c for c, t in tables], skip):
+        patlenres = '{}_{}'.format(rec.toptype, rec.length)
+        if rec.residues is not None:
+            patlenres += '_' + rec.residues
+        guess = tables[k][1].get(patlenres)
+        if guess is not None:
+            b = best.get(rec.line)
+            if b is None or better(guess, b):
+                best[rec.line] = guess
+    return best
+
+
+def best_guesses(i):
+    """protein_guesses of _prots[i], for the steps of the current
+    pass."""
+    return protein_guesses(_prots[i], _tables, _skip[i])
+
+
+def pruned_guesses(prot, tables, heads, chunk, min_quality):
+    """protein_guesses of prot for tables in bound_order, heads[k]
+    being (bound, step) of tables[k]. The tables are gone through chunk
+    at a time, skipping the Hbonds that are settled."""
+    best = {}
+    lines = set(hb.linenumber for hb in prot.Hbonds)
+    for start in xrange(0, len(tables), chunk):
+        skip = set(l for l in lines
+                   if settled(best.get(l), heads[start], min_quality))
+        if len(skip) == len(lines):
+            break
+        for line, guess in protein_guesses(
+                prot, tables[start:start + chunk], skip).iteritems():
+            b = best.get(line)
+            if b is None or better(guess, b):
+                best[line] = guess
+    return best
+
+
+def parse_rotations(lines):
+    """The rotations (e1, e2, e3, theta) in columns 16-19 of the lines
+    of a protein file."""
+    return np.array([l.split()[15:19] for l in lines],
+                    dtype=np.float64).reshape((-1, 4))
+
+
+def protein_name(fn):
+    name = os.path.basename(fn)
+    if name.endswith('.txt'):
+        name = name[:-len('.txt')]
+    return name
+
+
+def read_rotations(fn):
+    with open(fn) as f:
+        return parse_rotations(f)
+
+
+def read_table(assessments, step):
+    """{pattern: (quality, step, pattern, length, mode)} of step."""
+    # Adjust quality so that later steps get a minor bonus.
+    return dict((p, (a.quality + step / 100000.0, step, p, a.length, a.mode))
+                for p, a in assessments.table(step).iteritems())
+
+
+def bound_order(assessments, steps, args):
+    """[(bound, step)] of the steps having patterns and options accepted
+    by args, best first (see better), where bound is the highest
+    quality of the step, adjusted as in read_table."""
+    heads = []
+    for s in steps:
+        opts = assessments.options(s)
+        q = assessments.max_quality(s)
+        if opts is not None and q is not None and accept_options(opts, args):
+            heads.append((q + s / 100000.0, s))
+    heads.sort(key=lambda h: (-h[0], h[1]))
+    return heads
+
+
+def step_tables(assessments, steps, args):
+    """[(config, table)] of the steps whose options are accepted."""
+    tables = []
+    for s in steps:
+        dbg(args.debug, 'reading assesment file %4d', s)
+        opts = assessments.options(s)
+        if opts is None or not accept_options(opts, args):
+            dbg(args.debug, 'skipping step %d', s)
+            continue
+        tables.append((pattern_config(opts), read_table(assessments, s)))
+    return tables
+
+
+def predictions(rows, rot):
+    """Yield (protein, line number, quality, distance, guess, pattern,
+    length, step) for rows of (protein, line number, guess) and the
+    actual rotations rot."""
+    if not rows:
+        return
+
+    # The SO(3) matrices and Euler vectors of the guesses
+    modes = sorted(set(g[4] for _, _, g in rows if g[4] is not None))
+    mats = dict(zip(modes, mode_matrices(modes))) if modes else {}
+    evs = dict(zip(modes, matrix_to_ev(np.array([mats[m] for m in modes]))
+                   if modes else []))
+    mats[None] = np.eye(3)
+    evs[None] = '0.0,0.0,0.0'
+
+    rot = np.array(rot)
+    actual = so3.axis_angle_to_matrix(rot[:, :3], rot[:, 3], False)
+    guessed = np.array([mats[g[4]] for _, _, g in rows])
+    dist = so3.acos_real((so3.trace_products(actual, guessed) - 1)/2)
+    for (name, lineno, g), d in zip(rows, dist):
+        quality, step, patlenres, length, mode = g
+        yield name, lineno, quality, d, evs[mode], patlenres, length, step
+
+
+def predict(files, args, out=sys.stdout):
+    assessments = open_assessments(args.dir)
+
+    dbg(args.debug, 'reading %d proteins', len(files))
+    names = []
+    rotations = []
+    prots = []
+    for f in files:
+        name = protein_name(f)
+        names.append(name)
+        rotations.append(read_rotations(f))
+        prots.append(find_local_patterns.load_protein(
+            f, args.prot_store, args.array_protein))
+    index = dict((name, i) for i, name in enumerate(names))
+
+    # {(protein, line number): best guess}
+    guesses = {}
+    global _prots, _skip, _tables
+    _prots = prots
+    _skip = [()] * len(prots)
+    todo = range(len(prots))
+    if args.prune:
+        heads = bound_order(assessments, assessments.steps(), args)
+        steps = [s for _, s in heads]
+        lines = [set(hb.linenumber for hb in p.Hbonds) for p in prots]
+    else:
+        steps = assessments.steps()
+    for start in xrange(0, len(steps), args.steps_per_pass):
+        if args.prune:
+            _skip = [set(l for l in lines[i]
+                         if settled(guesses.get((names[i], l)), heads[start],
+                                    args.min_quality))
+                     for i in xrange(len(prots))]
+            todo = [i for i in xrange(len(prots))
+                    if len(_skip[i]) < len(lines[i])]
+            dbg(args.debug, '%d of %d Hbonds in %d proteins left',
+                sum(len(lines[i]) - len(_skip[i]) for i in todo),
+                sum(len(l) for l in lines), len(todo))
+            if not todo:
+                break
+        _tables = step_tables(assessments,
+                              steps[start:start + args.steps_per_pass], args)
+        if not _tables:
+            continue
+        dbg(args.debug, 'describing %d steps from step %d', len(_tables),
+            steps[start])
+        if args.jobs > 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(args.jobs)
+            try:
+                results = pool.map(best_guesses, todo)
+            finally:
+                pool.terminate()
+        else:
+            results = [best_guesses(i) for i in todo]
+        for i, best in zip(todo, results):
+            name = names[i]
+            for line, guess in best.iteritems():
+                g = guesses.get((name, line))
+                if g is None or better(guess, g):
+                    guesses[(name, line)] = guess
+
+    # Go through all Hbonds, i.e. lines of the protein files, in order
+    rows = []
+    rot = []
+    for name in sorted(index):
+        r = rotations[index[name]]
+        for lineno in xrange(1, len(r) + 1):
+            guess = guesses.get((name, lineno), no_guess)
+            if guess[0] >= args.min_quality:
+                rows.append((name, lineno, guess))
+                rot.append(r[lineno - 1])
+    for p in predictions(rows, rot):
+        out.write(line_format % p)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Guess the rotation of each Hbond from the assessed '
+        'patterns in the stepN_assess files.')
+    parser.add_argument('protein', nargs='*', help='Protein files')
+    parser.add_argument('--dir', required=True,
+                        help='Directory of the stepN_assess files, or a '
+                        'store compiled from it by assessstore.py')
+    parser.add_argument('--protfile',
+                        help='File listing the protein files, one per line')
+    parser.add_argument('--min-quality', type=int, default=0)
+    parser.add_argument('--min-window', type=int, default=0)
+    parser.add_argument('--max-window', type=int, default=1000)
+    parser.add_argument('--res-scheme',
+                        help='Only use the residue schemes in this string')
+    parser.add_argument('--min-twist', type=int, default=-1)
+    parser.add_argument('--max-twist', type=int, default=1000)
+    parser.add_argument('--extreme-remotes', action='store_true',
+                        help='Only use steps with no or all remotes')
+    parser.add_argument('--prot-store',
+                        help='Protein store created by protstore.py')
+    parser.add_argument('--array-protein', action='store_true',
+                        help='Keep the Hbonds in NumPy arrays')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='Number of processes describing proteins')
+    parser.add_argument('--steps-per-pass', type=int, default=100,
+                        metavar='N', help='Number of steps whose '
+                        'assessments are kept in memory at once')
+    parser.add_argument('--no-prune', dest='prune', action='store_false',
+                        help='Describe every Hbond for every step')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+    if args.prot_store:
+        from protstore import ProteinStore
+        args.prot_store = ProteinStore(args.prot_store)
+
+    files = args.protein
+    if args.protfile:
+        with open(args.protfile) as f:
+            files = [l.rstrip('\n') for l in f]
+    predict(files, args)
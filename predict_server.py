@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+#
+# File: predict_server.py
+#
+# Time-stamp: <>
+#
+# usage: predict_server.py [-h] --dir DIR (--socket PATH | --port N)
+#                          [--host HOST] [--min-quality Q]
+#                          [--min-window W] [--max-window W]
+#                          [--res-scheme SCHEMES] [--min-twist T]
+#                          [--max-twist T] [--extreme-remotes]
+#                          [--prot-store STORE] [--array-protein]
+#                          [--jobs N] [--steps-per-pass N] [--debug]
+#
+# Serves the predictions of predict_rotation.py over HTTP, on a Unix
+# socket (--socket) or a TCP port on localhost (--port). The assess
+# tables of all steps (DIR is an assess directory or a store compiled
+# by assessstore.py) and their pattern configs are loaded once at
+# start; the options selecting the steps are those of
+# predict_rotation.py. Requests:
+#
+#   POST /predict  {"files": [protein file, ...],
+#                   "proteins": [{"name": ..., "lines": protein file
+#                                 contents}, ...],
+#                   "min_quality": Q, "format": "json" or "text"}
+#
+# returns for each Hbond of the proteins (in the order given) with a
+# guess of at least quality Q (default --min-quality) the protein,
+# line number, quality, SO(3) distance to the actual rotation, the
+# guess as an Euler vector, pattern, length and step, as JSON
+# {"predictions": [{...}, ...]}, or as the lines printed by
+# predict_rotation.py. The proteins of a request are described in
+# parallel by the --jobs processes, --steps-per-pass steps at a time
+# in order of their highest quality, until all Hbonds are settled (see
+# predict_rotation.py).
+#
+#   GET /stats
+#
+# returns counters of requests, proteins and Hbonds, the throughput
+# and the latencies of the last requests. E.g.
+#
+#   curl --unix-socket /tmp/predict.sock http://localhost/predict \
+#        -d '{"files": ["test/1abc.txt"], "format": "text"}'
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: Prune steps by their highest quality
+#  2026-10-18: Describe one request at a time in the handler threads
+#
+
+import argparse
+import BaseHTTPServer
+import collections
+import json
+import multiprocessing
+import os
+import signal
+import SocketServer
+import sys
+import threading
+import time
+
+import numpy as np
+
+import find_local_patterns
+import predict_rotation
+from assessstore import open_assessments
+from cdp import Protein
+from protarray import ArrayProtein
+
+fields = ['protein', 'line', 'quality', 'distance', 'guess', 'pattern',
+          'length', 'step']
+
+# The step tables in bound order, their (bound, step) and the options,
+# set before forking the worker processes.
+_tables = []
+_heads = []
+_args = None
+
+
+def describe(item):
+    """(name, rotations, {line number: guess}) of the protein item,
+    (name, lines, file, min_quality) where lines (if not None) are the
+    contents of the protein file."""
+    name, lines, fn, min_quality = item
+    if lines is None:
+        prot = find_local_patterns.load_protein(fn, _args.prot_store,
+                                                _args.array_protein)
+        rot = predict_rotation.read_rotations(fn)
+    else:
+        prot = (ArrayProtein if _args.array_protein else Protein)(name=name)
+        prot.from_lines(lines)
+        rot = predict_rotation.parse_rotations(lines)
+    return name, rot, predict_rotation.pruned_guesses(
+        prot, _tables, _heads, _args.steps_per_pass, min_quality)
+
+
+class Predictor:
+    """The predictions for the steps in args.dir accepted by args."""
+
+    def __init__(self, args):
+        global _tables, _heads, _args
+        _args = args
+        assessments = open_assessments(args.dir)
+        _heads = predict_rotation.bound_order(assessments,
+                                              assessments.steps(), args)
+        _tables = predict_rotation.step_tables(
+            assessments, [s for _, s in _heads], args)
+        self.pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+        # The memo of find_local_patterns is not thread-safe
+        self.lock = threading.Lock()
+
+    def predict(self, items, min_quality):
+        """The predictions (see predict_rotation.predictions) for the
+        Hbonds of the proteins items with a guess of quality at least
+        min_quality."""
+        items = [item + (min_quality,) for item in items]
+        if self.pool is not None and len(items) > 1:
+            results = self.pool.map(describe, items)
+        else:
+            with self.lock:
+                results = map(describe, items)
+        rows = []
+        rot = []
+        for name, r, guesses in results:
+            for lineno in xrange(1, len(r) + 1):
+                guess = guesses.get(lineno, predict_rotation.no_guess)
+                if guess[0] >= min_quality:
+                    rows.append((name, lineno, guess))
+                    rot.append(r[lineno - 1])
+        return list(predict_rotation.predictions(rows, rot))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+
+
+class Counters:
+    """Totals since start, and the latencies of the last n requests."""
+
+    def __init__(self, n=1000):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.requests = self.errors = self.proteins = self.bonds = 0
+        self.busy = 0.0
+        self.latencies = collections.deque(maxlen=n)
+
+    def add(self, latency, proteins=0, bonds=0, error=False):
+        with self.lock:
+            self.requests += 1
+            self.errors += error
+            self.proteins += proteins
+            self.bonds += bonds
+            self.busy += latency
+            self.latencies.append(latency)
+
+    def stats(self):
+        with self.lock:
+            uptime = time.time() - self.start
+            s = {'uptime': uptime, 'requests': self.requests,
+                 'errors': self.errors, 'proteins': self.proteins,
+                 'bonds': self.bonds, 'busy': self.busy,
+                 'proteins_per_second': self.proteins / uptime,
+                 'proteins_per_busy_second':
+                 self.proteins / self.busy if self.busy else 0.0}
+            if self.latencies:
+                l = np.array(self.latencies)
+                s['latency'] = dict(
+                    [('mean', l.mean()), ('max', l.max())] +
+                    [('p{}'.format(q), np.percentile(l, q))
+                     for q in (50, 90, 99)])
+            return s
+
+
+def request_items(req):
+    """The proteins (name, lines, file) of the request req."""
+    items = [(predict_rotation.protein_name(f), None, f)
+             for f in req.get('files', [])]
+    for p in req.get('proteins', []):
+        lines = p['lines']
+        if isinstance(lines, basestring):
+            lines = lines.splitlines()
+        items.append((str(p['name']), lines, None))
+    return items
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def reply(self, code, body, content_type='application/json'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/stats':
+            self.reply(404, json.dumps({'error': 'not found'}))
+            return
+        self.reply(200, json.dumps(self.server.counters.stats()))
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.reply(404, json.dumps({'error': 'not found'}))
+            return
+        start = time.time()
+        try:
+            n = int(self.headers.getheader('Content-Length', 0))
+            req = json.loads(self.rfile.read(n))
+            items = request_items(req)
+            preds = self.server.predictor.predict(
+                items, req.get('min_quality', self.server.min_quality))
+        except Exception as e:
+            self.server.counters.add(time.time() - start, error=True)
+            code = 400 if isinstance(e, (ValueError, KeyError, TypeError,
+                                         IOError)) else 500
+            self.reply(code, json.dumps({'error': '{}: {}'.format(
+                type(e).__name__, e)}))
+            return
+        if req.get('format') == 'text':
+            body = ''.join(predict_rotation.line_format % p for p in preds)
+            content_type = 'text/plain'
+        else:
+            body = json.dumps({'predictions': [dict(zip(fields, p))
+                                               for p in preds]})
+            content_type = 'application/json'
+        self.server.counters.add(time.time() - start, len(items), len(preds))
+        self.reply(200, body, content_type)
+
+    def address_string(self):
+        return str(self.client_address[0])
+
+    def log_message(self, fmt, *args):
+        if self.server.debug:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, fmt, *args)
+
+
+class TCPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ('unix', 0)
+
+
+def serve(args):
+    start = time.time()
+    predictor = Predictor(args)
+    predict_rotation.dbg(args.debug, 'loaded %d steps in %.1f s',
+                         len(_tables), time.time() - start)
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixServer(args.socket, Handler)
+    else:
+        server = TCPServer((args.host, args.port), Handler)
+    server.predictor = predictor
+    server.counters = Counters()
+    server.min_quality = args.min_quality
+    server.debug = args.debug
+    # Clean up on kill as well as on ^C; the pool has been forked.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        predictor.close()
+        if args.socket:
+            os.remove(args.socket)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve the rotation guesses of predict_rotation.py '
+        'over HTTP.')
+    parser.add_argument('--dir', required=True,
+                        help='Directory of the stepN_assess files, or a '
+                        'store compiled from it by assessstore.py')
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--socket', metavar='PATH',
+                       help='Listen on the Unix socket PATH')
+    where.add_argument('--port', type=int, metavar='N',
+                       help='Listen on TCP port N')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Address to listen on with --port')
+    parser.add_argument('--min-quality', type=int, default=0)
+    parser.add_argument('--min-window', type=int, default=0)
+    parser.add_argument('--max-window', type=int, default=1000)
+    parser.add_argument('--res-scheme',
+                        help='Only use the residue schemes in this string')
+    parser.add_argument('--min-twist', type=int, default=-1)
+    parser.add_argument('--max-twist', type=int, default=1000)
+    parser.add_argument('--extreme-remotes', action='store_true',
+                        help='Only use steps with no or all remotes')
+    parser.add_argument('--prot-store',
+                        help='Protein store created by protstore.py')
+    parser.add_argument('--array-protein', action='store_true',
+                        help='Keep the Hbonds in NumPy arrays')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='Number of processes describing proteins')
+    parser.add_argument('--steps-per-pass', type=int, default=20,
+                        metavar='N', help='Number of steps described '
+                        'between checks for settled Hbonds')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args()
+    if args.prot_store:
+        from protstore import ProteinStore
+        args.prot_store = ProteinStore(args.prot_store)
+    serve(args)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+#
+# File: protarray.py
+#
+# Time-stamp: <>
+#
+# Description: An array-backed alternative to cdp.Protein. Instead of
+#  one Hbond object per bond and a dict keyed by atom index, the
+#  Hbonds are kept as NumPy columns (struct-of-arrays), and a dense
+#  array spanning minidx..maxidx maps each atom to the id of the
+#  Hbond incident on it, or -1. Hbond objects are only created on
+#  demand, as light-weight views into the columns, so existing code
+#  using the Hbond API (CDP.find_matches) keeps working;
+#  find_local_patterns.py describes the Hbonds of an ArrayProtein from
+#  the columns, all at once.
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: Twist detection from so3.py
+#  2026-10-18: Reset the bond index used by CDP.find_matches
+#  2026-10-18: Drop the list copy of bond_of
+#
+
+import numpy as np
+
+import so3
+from cdp import Hbond, Protein
+
+
+class HbondView(Hbond, object):
+    """An Hbond backed by row bid of the columns of an ArrayProtein."""
+    __slots__ = ('prot', 'bid')
+
+    def __init__(self, prot, bid):
+        self.prot = prot
+        self.bid = bid
+
+    @property
+    def linenumber(self):
+        return self.prot.linenumber.item(self.bid)
+
+    @property
+    def donor(self):
+        return self.prot.donor.item(self.bid)
+
+    @property
+    def accptr(self):
+        return self.prot.accptr.item(self.bid)
+
+    @property
+    def length(self):
+        return self.prot.length.item(self.bid)
+
+    @property
+    def cluster(self):
+        return self.prot.cluster[self.bid]
+
+    @property
+    def flags(self):
+        return self.prot.flags[self.bid]
+
+    @property
+    def residues(self):
+        return self.prot.hbond_residues[self.bid]
+
+    @property
+    def so3matrix(self):
+        return tuple(tuple(r) for r in self.prot.so3[self.bid].tolist())
+
+    @property
+    def ident(self):
+        return None
+
+    @property
+    def colors(self):
+        return self.prot.colors.setdefault(self.bid, [])
+
+    def add_color(self, s):
+        self.colors.append(s)
+
+    def other_end(self, idx):
+        donor = self.prot.donor.item(self.bid)
+        accptr = self.prot.accptr.item(self.bid)
+        if idx == donor:
+            return accptr
+        if idx == accptr:
+            return donor
+        raise Exception("cannot determine other_end without knowing one end...")
+
+    def is_twisted(self):
+        return self.prot.twisted.item(self.bid)
+
+
+class ArrayProtein(Protein, object):
+    """A Protein whose Hbonds are stored in NumPy columns.
+
+    The columns (linenumber, donor, accptr, length, twisted, cluster,
+    flags, hbond_residues, so3) are indexed by bond id, which is the
+    position of the Hbond when ordered by line number, just like
+    Protein.Hbonds. bond_of[idx - base] is the bond id of the Hbond
+    incident on atom idx, or -1.
+
+    All Hbonds must be added in one go, via from_file, from_store or
+    add_Hbond_records. Tertiary interactions, residue and secondary
+    structure information are handled as in Protein.
+    """
+
+    def __init__(self, name="(noname)"):
+        self.name = name
+        # Only Tbonds go into the vertices dict.
+        self.vertices = dict()
+        self.residues = dict()
+        self.ssclass = dict()
+        self.Tbonds = []
+        self.minidx = 2 ** 20
+        self.maxidx = -1
+        self.set_columns([])
+
+    def add_Hbond(self, *args, **kwargs):
+        raise Exception("ArrayProtein does not support adding single Hbonds; use add_Hbond_records")
+
+    def add_Hbond_records(self, records):
+        # Same selection as Protein.add_Hbond_records: in order of
+        # increasing energy, add each Hbond unless one of its ends is
+        # already taken.
+        records.sort(key=lambda x: x.energy)
+        used = set()
+        accepted = []
+        for r in records:
+            if r.i in used or r.j in used or r.i == r.j:
+                continue
+            if r.residues is not None:
+                self.add_residue((r.i-2)//3, r.residues[0])
+                self.add_residue((r.i+1)//3, r.residues[1])
+                self.add_residue((r.j-1)//3, r.residues[2])
+                self.add_residue((r.j+2)//3, r.residues[3])
+            used.add(r.i)
+            used.add(r.j)
+            accepted.append(r)
+        accepted.sort(key=lambda x: x.linenumber)
+        self.set_columns(accepted)
+
+    def set_columns(self, records):
+        n = len(records)
+        self.linenumber = np.array([r.linenumber for r in records], dtype=np.int32)
+        self.donor = np.array([r.i for r in records], dtype=np.int32)
+        self.accptr = np.array([r.j for r in records], dtype=np.int32)
+        self.length = np.array([r.length for r in records], dtype=np.int32)
+        self.cluster = [r.cluster for r in records]
+        self.flags = [r.flags for r in records]
+        self.hbond_residues = [r.residues for r in records]
+        self.so3 = np.array([r.so3matrix for r in records], dtype=np.float64).reshape((n, 3, 3))
+        self.twisted = so3.is_twisted(self.so3)
+
+        if n:
+            lo = int(min(self.donor.min(), self.accptr.min()))
+            hi = int(max(self.donor.max(), self.accptr.max()))
+            self.minidx = min(lo, self.minidx)
+            self.maxidx = max(hi, self.maxidx)
+        else:
+            lo = hi = 0
+        self.base = lo
+        self.bond_of = np.empty(hi - lo + 1 if n else 0, dtype=np.int32)
+        self.bond_of.fill(-1)
+        self.bond_of[self.donor - lo] = np.arange(n)
+        self.bond_of[self.accptr - lo] = np.arange(n)
+        self.nvertices = len(self.bond_of)
+
+        self.views = [None] * n
+        self.colors = dict()
+        self._bond_index = None
+
+    def __len__(self):
+        return len(self.linenumber)
+
+    def get_view(self, bid):
+        v = self.views[bid]
+        if v is None:
+            v = self.views[bid] = HbondView(self, bid)
+        return v
+
+    @property
+    def Hbonds(self):
+        return [self.get_view(b) for b in xrange(len(self))]
+
+    def get_Hbond(self, idx):
+        """Return the Hbond attached at index idx, or None if no Hbond is at that index."""
+        assert(idx % 3 != 1)
+        k = idx - self.base
+        if not 0 <= k < self.nvertices:
+            return None
+        b = self.bond_of.item(k)
+        if b < 0:
+            return None
+        v = self.views[b]
+        if v is None:
+            v = self.views[b] = HbondView(self, b)
+        return v
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+#
+# File: protstore.py
+#
+# Time-stamp: <>
+#
+# usage: protstore.py [-h] prot_dir store_dir
+#
+# Converts a directory of protein files (prot/{protein id}.txt) into a
+# columnar store, so that the later stages do not have to re-parse
+# the whitespace separated text files over and over again. The store
+# is a directory of .npy files, one per column, which are opened
+# memory-mapped. Rows are the lines of the protein files in order;
+# offsets.npy holds, for each protein in names.npy, the index of its
+# first row (and a final entry with the total number of rows), so
+# the line number of a row is its index minus the protein offset,
+# plus one.
+#
+# positional arguments:
+#   prot_dir    Directory containing the protein files.
+#   store_dir   Output directory for the store.
+#
+# optional arguments:
+#   -h, --help  show this help message and exit
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: Stores pickle by directory, for use with multiprocessing
+#
+
+import argparse
+import os
+
+import numpy as np
+
+# Columns (0-based) in the protein files. These are the same as the
+# ones used by cdp.Protein.from_file and get_rotations.
+res_col_start = 4
+res_col_end = 8
+donor_col = 12
+accptr_col = 13
+len_col = 14
+rot_col_start = 15
+rot_col_end = 19
+energy_col = 20
+flags_col = 21
+cluster_col = 45
+so3_col_start = 50
+so3_col_end = 59
+
+columns = ('donor', 'acceptor', 'length', 'energy', 'flags', 'cluster',
+           'residues', 'so3', 'rotation', 'rotation_text')
+
+
+def build_store(prot_dir, store_dir, files=None):
+    """
+    Parse all protein files in prot_dir (or only those listed in
+    files) and write the columnar store to store_dir.
+    """
+    if files is None:
+        files = sorted(f for f in os.listdir(prot_dir)
+                       if f.endswith('.txt'))
+    if not os.path.exists(store_dir):
+        os.mkdir(store_dir)
+
+    names = []
+    offsets = [0]
+    cols = dict((c, []) for c in columns)
+    for fn in files:
+        with open(os.path.join(prot_dir, fn)) as f:
+            for line in f:
+                fields = line.split()
+                cols['donor'].append(int(fields[donor_col]))
+                cols['acceptor'].append(int(fields[accptr_col]))
+                cols['length'].append(int(fields[len_col]))
+                cols['energy'].append(float(fields[energy_col]))
+                cols['flags'].append(fields[flags_col])
+                cols['cluster'].append(fields[cluster_col])
+                # Sometimes ? is used for unknown, sometimes X; see
+                # Protein.from_file.
+                cols['residues'].append(
+                    ''.join(fields[res_col_start:res_col_end])
+                    .replace('?', 'X'))
+                cols['so3'].append(
+                    [float(x) for x in fields[so3_col_start:so3_col_end]])
+                rot = fields[rot_col_start:rot_col_end]
+                cols['rotation'].append([float(x) for x in rot])
+                cols['rotation_text'].append(rot)
+        names.append(os.path.splitext(fn)[0])
+        offsets.append(len(cols['donor']))
+
+    arrays = {
+        'names': np.array(names, dtype=str),
+        'offsets': np.array(offsets, dtype=np.int64),
+        'donor': np.array(cols['donor'], dtype=np.int32),
+        'acceptor': np.array(cols['acceptor'], dtype=np.int32),
+        'length': np.array(cols['length'], dtype=np.int32),
+        'energy': np.array(cols['energy'], dtype=np.float64),
+        'flags': np.array(cols['flags'], dtype=str),
+        'cluster': np.array(cols['cluster'], dtype=str),
+        'residues': np.array(cols['residues'], dtype=str),
+        'so3': np.array(cols['so3'],
+                        dtype=np.float64).reshape((-1, 3, 3)),
+        'rotation': np.array(cols['rotation'],
+                             dtype=np.float64).reshape((-1, 4)),
+        'rotation_text': np.array(cols['rotation_text'],
+                                  dtype=str).reshape((-1, 4)),
+    }
+    for name, a in arrays.iteritems():
+        np.save(os.path.join(store_dir, name + '.npy'), a)
+
+
+class ProteinStore:
+    """
+    Read-only access to a store written by build_store. All columns
+    are memory-mapped, so opening a store is cheap no matter how many
+    proteins it contains.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.names = self._load('names')
+        self.offsets = self._load('offsets')
+        for c in columns:
+            setattr(self, c, self._load(c))
+        self.index = dict((n, i) for i, n in enumerate(self.names))
+
+    def _load(self, name):
+        return np.load(os.path.join(self.store_dir, name + '.npy'),
+                       mmap_mode='r')
+
+    # Pickle by directory, so that a store can be handed to other
+    # processes without copying the columns.
+    def __getstate__(self):
+        return self.store_dir
+
+    def __setstate__(self, store_dir):
+        self.__init__(store_dir)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+    def rows(self, name):
+        """Return the slice of rows belonging to protein name."""
+        i = self.index[name]
+        return slice(self.offsets[i], self.offsets[i+1])
+
+    def row(self, name, linenumber):
+        """Return the row index of line linenumber (1-based) of name."""
+        i = self.index[name]
+        r = self.offsets[i] + linenumber - 1
+        if not self.offsets[i] <= r < self.offsets[i+1]:
+            raise IndexError('{} has no line {}'.format(name, linenumber))
+        return r
+
+    def hbond_records(self, name):
+        """
+        Yield (linenumber, donor, acceptor, length, cluster, energy,
+        flags, residues, so3matrix) for each line of protein name,
+        with the same types as Protein.from_file would produce.
+        """
+        s = self.rows(name)
+        cols = zip(self.donor[s].tolist(), self.acceptor[s].tolist(),
+                   self.length[s].tolist(), self.cluster[s].tolist(),
+                   self.energy[s].tolist(), self.flags[s].tolist(),
+                   self.residues[s].tolist(), self.so3[s].tolist())
+        for k, (i, j, length, cluster, energy, flags, residues,
+                so3) in enumerate(cols):
+            matrix = tuple(tuple(r) for r in so3)
+            yield (k+1, i, j, length, cluster, energy, flags, residues,
+                   matrix)
+
+    def rotation_strings(self, name):
+        """Return the rotation columns 16-19 of name as strings."""
+        return [tuple(r) for r in self.rotation_text[self.rows(name)]
+                .tolist()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert protein files into a columnar store.')
+    parser.add_argument('prot_dir', help='Directory containing the '
+                        'protein files.')
+    parser.add_argument('store_dir', help='Output directory for the '
+                        'store.')
+    args = parser.parse_args()
+    build_store(args.prot_dir, args.store_dir)
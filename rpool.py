@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# File: rpool.py
+#
+# Time-stamp: <>
+#
+# Description: Long-lived R processes for the clustering. Running
+#  Rscript Rasmus2.r for each pattern starts R and sources
+#  StartClustSubsetVers4.txt every time, which takes longer than
+#  clustering most patterns. An RWorker runs cluster_worker.r, which
+#  sources the clustering code once and then takes jobs (a label and
+#  the rotations) over its stdin, writing {label}_Summary.txt and
+#  {label}_BoxId.txt as Rasmus2.r does. If the R process dies, the
+#  job it was running fails and the worker is restarted. RWorkerPool
+#  runs jobs on several workers.
+#
+# History:
+#  2026-10-18: Created
+#
+
+import os
+import subprocess
+import threading
+import Queue
+from multiprocessing.pool import ThreadPool
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+worker_script = 'cluster_worker.r'
+cluster_file = 'StartClustSubsetVers4.txt'
+marker = '@@cdp-worker '
+
+
+class RWorkerError(Exception):
+    """Clustering failed; log holds what R printed for the job."""
+
+    def __init__(self, msg, log=''):
+        Exception.__init__(self, msg)
+        self.log = log
+
+
+def read_rotation_rows(fn):
+    """Return the rotations in file fn as lists of strings."""
+    with open(fn) as f:
+        return [l.split() for l in f if l.strip()]
+
+
+class RWorker:
+    """A clustering R process. script_dir is where cluster_worker.r
+    and StartClustSubsetVers4.txt are."""
+
+    def __init__(self, script_dir=script_dir, rscript='Rscript'):
+        self.cmd = [rscript, os.path.join(script_dir, worker_script),
+                    os.path.join(script_dir, cluster_file)]
+        self.proc = None
+        self.restarts = 0
+        self.start()
+
+    def start(self):
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT)
+        reply, log = self._read_reply()
+        if reply != 'READY':
+            self.proc.wait()
+            raise RWorkerError('R worker failed to start', log)
+
+    def restart(self):
+        self.close()
+        self.restarts += 1
+        self.start()
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def _read_reply(self):
+        """Read up to the next marker line. Returns (reply, log), with
+        reply None if the process has died."""
+        lines = []
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                return None, ''.join(lines)
+            if line.startswith(marker):
+                return line[len(marker):].strip(), ''.join(lines)
+            lines.append(line)
+
+    def cluster(self, label, rot):
+        """Cluster the rotations rot (rows of four numbers or strings)
+        writing {label}_Summary.txt and {label}_BoxId.txt. Returns the
+        log, that is, what R printed; raises RWorkerError on failure."""
+        if not self.alive():
+            self.restart()
+        rows = ['\t'.join(x if isinstance(x, basestring) else repr(x)
+                          for x in r) for r in rot]
+        job = '{}\t{}\n'.format(len(rows), label) + ''.join(
+            r + '\n' for r in rows)
+        try:
+            self.proc.stdin.write(job)
+            self.proc.stdin.flush()
+        except IOError:
+            reply, log = None, ''
+        else:
+            reply, log = self._read_reply()
+        if reply is None:
+            self.restart()
+            raise RWorkerError('R worker died while clustering ' + label, log)
+        if reply != 'OK':
+            raise RWorkerError(reply, log)
+        return log
+
+    def summary(self, label, rot):
+        """As cluster, but return the content of {label}_Summary.txt."""
+        self.cluster(label, rot)
+        with open(label + '_Summary.txt') as f:
+            return f.read()
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except IOError:
+            pass
+        self.proc.wait()
+        self.proc = None
+
+
+class RWorkerPool:
+    """n RWorkers, each serving one job at a time."""
+
+    def __init__(self, n=1, script_dir=script_dir, rscript='Rscript'):
+        self.workers = [RWorker(script_dir, rscript) for _ in xrange(n)]
+        self.idle = Queue.Queue()
+        for w in self.workers:
+            self.idle.put(w)
+        self.threads = ThreadPool(n)
+
+    def _run(self, job):
+        label, rot = job
+        w = self.idle.get()
+        try:
+            return label, w.cluster(label, rot), None
+        except RWorkerError as e:
+            return label, e.log, e
+        finally:
+            self.idle.put(w)
+
+    def map(self, jobs):
+        """Run jobs, (label, rotations) pairs. Yields (label, log,
+        error) in the order of jobs, error being None or the
+        RWorkerError of a failed job."""
+        return self.threads.imap(self._run, jobs)
+
+    def close(self):
+        self.threads.close()
+        self.threads.join()
+        for w in self.workers:
+            w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_worker(script_dir=script_dir):
+    """An RWorker kept for the lifetime of this process, for callers
+    (such as the pp jobs in abacus/clstr.py) that cluster one pattern
+    at a time."""
+    with _shared_lock:
+        if script_dir not in _shared:
+            _shared[script_dir] = RWorker(script_dir)
+        return _shared[script_dir]
@@ -13,19 +13,24 @@
 #  2016/05/19: yk: Delete temp_dir at the end
 #  2016/05/24: yk: Changed outpur redirect to solve bad fd number
 #  2016/05/27: yk: Run clustering for files without extenstion (".")
+#  2026/10/18: Run find_local_patterns in-process
+#  2026/10/18: engine='Rpool' clusters with long-lived R workers
 
 
 import os
 import shutil
 import filter_bonds
+import find_local_patterns
 import get_rotations
+import rpool
 
 cluster_script = 'Rasmus2.r'
 cluster_file = 'StartClustSubsetVers4.txt'
 
 
 def run(min_occurrence, temp_dir, out_dir, input, window_size,
-        nearby_remotes=None, nearby_twists=None, residue_scheme=None):
+        nearby_remotes=None, nearby_twists=None, residue_scheme=None,
+        engine='R', jobs=1):
     # create temp and out dir if they don't exist
     if not os.path.exists(temp_dir):
         os.mkdir(temp_dir)
@@ -33,13 +38,12 @@ def run(min_occurrence, temp_dir, out_dir, input, window_size,
         os.mkdir(out_dir)
 
     # run find_local_pattern with given parameters
-    # Using os.system to avoid editing find_local_patterns.py.
     if os.path.isdir(input):
         fs = []
         for file in os.listdir(input):
             fs.append(os.path.join(input, file))
     elif os.path.isfile(input):
-        fs.append(input)
+        fs = [input]
 
     # Sensible values for parameters if not given
     if nearby_remotes is None:
@@ -49,27 +53,16 @@ def run(min_occurrence, temp_dir, out_dir, input, window_size,
     if residue_scheme is None:
         residue_scheme = 0  # Disable residue
 
-    # List of files might be too long -split it
-    flist = [fs[i:i+200] for i in xrange(0, len(fs), 200)]
+    config = find_local_patterns.PatternConfig(
+        window_size=int(window_size),
+        nearby_remotes=int(nearby_remotes),
+        nearby_twists=int(nearby_twists),
+        residue_scheme=int(residue_scheme),
+        always_include_remotes=True,
+        show_residues=True)
     flp_out = os.path.join(temp_dir, 'flp.txt')
-
-    for s in flist:
-        files = ' '.join(s)
-        cmd = ('python find_local_patterns.py {f}'
-               ' --window-size {w}'
-               ' --nearby-remotes {r}'
-               ' --nearby-twists {t}'
-               ' --residue-scheme {s}'
-               ' --always-include-remotes'
-               ' --show-residues'
-               ' >> {o}').format(
-                   f=files,
-                   w=str(window_size),
-                   r=str(nearby_remotes),
-                   t=str(nearby_twists),
-                   s=str(residue_scheme),
-                   o=flp_out)
-        os.system(cmd)
+    with open(flp_out, 'a') as o:
+        find_local_patterns.write_patterns(fs, config, o)
 
     # run filter_bonds
     fb_out = os.path.join(temp_dir, 'filtered.txt')
@@ -83,6 +76,20 @@ def run(min_occurrence, temp_dir, out_dir, input, window_size,
     get_rotations.get_rotations(fb_out, out_dir, prot_dir)
 
     # run cluster analysis
+    if engine == 'Rpool':
+        rot_files = [os.path.join(out_dir, f) for f in os.listdir(out_dir)
+                     if "." not in f]
+        work = ((f, rpool.read_rotation_rows(f)) for f in rot_files)
+        with rpool.RWorkerPool(jobs) as pool:
+            for f, log, error in pool.map(work):
+                out = '.'.join([os.path.splitext(f)[0], 'out'])
+                with open(out, 'w') as o:
+                    o.write(log)
+                    if error:
+                        o.write('Error: {}\n'.format(error))
+        shutil.rmtree(temp_dir)
+        return
+
     shutil.copy(cluster_script, out_dir)
     shutil.copy(cluster_file, out_dir)
     rscript = os.path.join(out_dir, cluster_script)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+#
+# File: so3.py
+#
+# Time-stamp: <>
+#
+# Description: Rotation math on arrays of rotations. Every function
+#  takes and returns NumPy arrays holding any number of rotations, as
+#  Euler vectors (..., 3) (axis times angle), axes and angles,
+#  matrices (..., 3, 3) or unit quaternions (..., 4), stored as
+#  (w, x, y, z) with w >= 0. This is the rotation math of
+#  improve_modebox.pl and predict_rotation (EV_to_SO3, SO3_to_EV,
+#  SO3_distance, do_magic_rotation) and of makemat/distFct in
+#  StartClustSubsetVers4.txt. ev_to_matrix, axis_angle_to_matrix,
+#  matmul and trace_products do the arithmetic in the same order as
+#  the Perl code, which improve_modebox.py relies on.
+#
+# History:
+#  2026-10-18: Created
+#  2026-10-18: acos_real, and axis_angle_to_matrix without normalizing
+#   the axis, as EV_to_SO3 does when given an axis and an angle.
+#
+
+import numpy as np
+
+nb = 81  # number of boxes per axis of the grid
+delta = 2*np.pi/nb
+
+# The box used for the magic rotation, which rotates the data away
+# from the boundary of the grid before clustering.
+magic_box = (32, 70, 31)
+
+
+def matmul(a, b):
+    """Products of the 3x3 matrices a and b (broadcasting), summing in
+    the order of gsl_blas_dgemm."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return (a[..., :, 0, None]*b[..., None, 0, :] +
+            a[..., :, 1, None]*b[..., None, 1, :] +
+            a[..., :, 2, None]*b[..., None, 2, :])
+
+
+def hat(axis):
+    """The cross product matrices of the vectors axis (..., 3)."""
+    axis = np.asarray(axis, dtype=np.float64)
+    x, y, z = axis[..., 0], axis[..., 1], axis[..., 2]
+    zero = np.zeros_like(x)
+    return np.stack((np.stack((zero, -z, y), axis=-1),
+                     np.stack((z, zero, -x), axis=-1),
+                     np.stack((-y, x, zero), axis=-1)), axis=-2)
+
+
+def _rodrigues(axis, angle):
+    k = hat(axis)
+    s = np.sin(angle)[..., None, None]
+    c = (1 - np.cos(angle))[..., None, None]
+    return (np.eye(3) + s*k) + c*matmul(k, k)
+
+
+def norm(v):
+    """The lengths of the vectors v (..., 3)."""
+    v = np.asarray(v, dtype=np.float64)
+    return np.sqrt(v[..., 0]*v[..., 0] + v[..., 1]*v[..., 1] +
+                   v[..., 2]*v[..., 2])
+
+
+def axis_angle_to_matrix(axis, angle, normalize=True):
+    """The matrices of the rotations by angle around axis (normalized
+    here, unless it is zero or normalize is False)."""
+    axis = np.asarray(axis, dtype=np.float64)
+    if normalize:
+        n = norm(axis)[..., None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            axis = np.where(n != 0, axis/n, axis)
+    return _rodrigues(axis, np.asarray(angle, dtype=np.float64))
+
+
+def ev_to_matrix(v):
+    """The matrices of the Euler vectors v. The zero vector is the
+    identity."""
+    v = np.asarray(v, dtype=np.float64)
+    angle = norm(v)
+    a = angle[..., None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        axis = np.where(a > 0, v/a, np.array([1.0, 0.0, 0.0]))
+    return _rodrigues(axis, angle)
+
+
+def rotation_to_matrix(rot):
+    """The matrices of rotations (e1, e2, e3, theta), as given in
+    columns 16-19 of the protein files and in the rotation files."""
+    rot = np.asarray(rot, dtype=np.float64)
+    return axis_angle_to_matrix(rot[..., :3], rot[..., 3])
+
+
+def _skew(m):
+    # 2 sin(angle) axis
+    return np.stack((m[..., 2, 1] - m[..., 1, 2],
+                     m[..., 0, 2] - m[..., 2, 0],
+                     m[..., 1, 0] - m[..., 0, 1]), axis=-1)
+
+
+def angle(m):
+    """The rotation angles (in [0, pi]) of the matrices m."""
+    m = np.asarray(m, dtype=np.float64)
+    t = m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2]
+    # atan2 rather than acos, which is inaccurate close to 0 and pi.
+    return np.arctan2(norm(_skew(m))/2, (t - 1)/2)
+
+
+def matrix_to_ev(m):
+    """The Euler vectors (angle in [0, pi]) of the matrices m."""
+    m = np.asarray(m, dtype=np.float64)
+    th = angle(m)
+    w = _skew(m)
+    s = np.sin(th)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # th/(2 sin th), with its series close to 0
+        f = np.where(s > 0.0001, th/(2*s), 0.5 + th*th/12)
+    v = w*f[..., None]
+    # Close to pi the axis is found from the symmetric part,
+    # (m + m^T)/2 = cos(th) I + (1 - cos(th)) axis axis^T.
+    near_pi = (s <= 0.0001) & (th > np.pi/2)
+    if near_pi.any():
+        mp = m[near_pi]
+        c = np.cos(th[near_pi])
+        aa = ((mp + np.swapaxes(mp, -1, -2))/2 -
+              c[:, None, None]*np.eye(3))/(1 - c)[:, None, None]
+        k = np.argmax(np.diagonal(aa, axis1=-2, axis2=-1), axis=-1)
+        r = np.arange(len(k))
+        axis = aa[r, k]/np.sqrt(aa[r, k, k])[:, None]
+        # Choose the sign agreeing with the skew symmetric part.
+        sign = np.where((axis*w[near_pi]).sum(axis=-1) < 0, -1.0, 1.0)
+        v[near_pi] = axis*(sign*th[near_pi])[:, None]
+    return v
+
+
+def matrix_to_rotation(m):
+    """The rotations (e1, e2, e3, theta) of the matrices m, with the
+    axis (1, 0, 0) for the identity."""
+    v = matrix_to_ev(m)
+    th = norm(v)[..., None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        axis = np.where(th > 0, v/th, np.array([1.0, 0.0, 0.0]))
+    return np.concatenate((axis, th), axis=-1)
+
+
+def matrix_to_quaternion(m):
+    """The unit quaternions of the matrices m (Shepperd's method)."""
+    m = np.asarray(m, dtype=np.float64)
+    d = np.stack((m[..., 0, 0] + m[..., 1, 1] + m[..., 2, 2],
+                  m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]), axis=-1)
+    k = np.argmax(d, axis=-1)
+    # Candidate quaternions (times 4 times the pivot), one per pivot.
+    t = d[..., 0]
+    cand = np.stack((
+        np.stack((1 + t, m[..., 2, 1] - m[..., 1, 2],
+                  m[..., 0, 2] - m[..., 2, 0],
+                  m[..., 1, 0] - m[..., 0, 1]), axis=-1),
+        np.stack((m[..., 2, 1] - m[..., 1, 2],
+                  1 + 2*m[..., 0, 0] - t, m[..., 0, 1] + m[..., 1, 0],
+                  m[..., 0, 2] + m[..., 2, 0]), axis=-1),
+        np.stack((m[..., 0, 2] - m[..., 2, 0],
+                  m[..., 0, 1] + m[..., 1, 0], 1 + 2*m[..., 1, 1] - t,
+                  m[..., 1, 2] + m[..., 2, 1]), axis=-1),
+        np.stack((m[..., 1, 0] - m[..., 0, 1],
+                  m[..., 0, 2] + m[..., 2, 0],
+                  m[..., 1, 2] + m[..., 2, 1],
+                  1 + 2*m[..., 2, 2] - t), axis=-1)), axis=-2)
+    q = np.take_along_axis(cand, k[..., None, None], axis=-2)[..., 0, :]
+    q = q/np.sqrt((q*q).sum(axis=-1))[..., None]
+    return np.where(q[..., :1] < 0, -q, q)
+
+
+def quaternion_to_matrix(q):
+    """The matrices of the (not necessarily unit) quaternions q."""
+    q = np.asarray(q, dtype=np.float64)
+    q = q/np.sqrt((q*q).sum(axis=-1))[..., None]
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    return np.stack((
+        np.stack((1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y)), axis=-1),
+        np.stack((2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x)), axis=-1),
+        np.stack((2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y)), axis=-1)),
+        axis=-2)
+
+
+def ev_to_quaternion(v):
+    """The unit quaternions of the Euler vectors v."""
+    v = np.asarray(v, dtype=np.float64)
+    th = norm(v)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # sin(th/2)/th, with its series close to 0
+        f = np.where(th > 1e-8, np.sin(th/2)/th, 0.5 - th*th/48)
+    q = np.concatenate((np.cos(th/2)[..., None], v*f[..., None]), axis=-1)
+    return np.where(q[..., :1] < 0, -q, q)
+
+
+def quaternion_to_ev(q):
+    """The Euler vectors (angle in [0, pi]) of the quaternions q."""
+    q = np.asarray(q, dtype=np.float64)
+    q = q/np.sqrt((q*q).sum(axis=-1))[..., None]
+    q = np.where(q[..., :1] < 0, -q, q)
+    s = norm(q[..., 1:])
+    th = 2*np.arctan2(s, q[..., 0])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f = np.where(s > 0, th/s, 2.0)
+    return q[..., 1:]*f[..., None]
+
+
+def trace_products(a, b):
+    """trace(a^T b) for the matrices a and b (broadcasting), summing in
+    the order of gsl_blas_dgemm followed by a sum of the diagonal."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    d = [a[..., 0, i]*b[..., 0, i] + a[..., 1, i]*b[..., 1, i] +
+         a[..., 2, i]*b[..., 2, i] for i in xrange(3)]
+    return d[0] + d[1] + d[2]
+
+
+def acos_real(z):
+    """acos of z clipped to [-1, 1], computed as acos_real of Perl's
+    Math::Trig does."""
+    z = np.clip(z, -1, 1)
+    return np.where(z <= -1, np.pi, np.arctan2(np.sqrt(1 - z*z), z))
+
+
+def distance(a, b):
+    """The geodesic distances (angles of a^T b) between the matrices a
+    and b (broadcasting, so b can be one matrix and a many)."""
+    return np.arccos(np.clip((trace_products(a, b) - 1)/2, -1, 1))
+
+
+def distances(a, b):
+    """The len(a) x len(b) array of distances between the matrices of
+    a and those of b."""
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return distance(a[:, None], b[None])
+
+
+def quaternion_distance(p, q):
+    """The geodesic distances between unit quaternions p and q
+    (broadcasting). More accurate than distance for small angles."""
+    d = np.abs((np.asarray(p)*np.asarray(q)).sum(axis=-1))
+    return 2*np.arccos(np.minimum(d, 1))
+
+
+def box_center(idx):
+    """The Euler vectors of the centres of the boxes idx (..., 3) of
+    the grid, with boxes numbered 1..nb."""
+    return -np.pi + (np.asarray(idx) - 0.5)*delta
+
+
+def box_index(v):
+    """The boxes of the grid holding the Euler vectors v."""
+    return np.rint((np.asarray(v) + np.pi)/delta + 0.5).astype(np.int64)
+
+
+magic_matrix = ev_to_matrix(box_center(magic_box)).T
+
+
+def magic_rotation(m):
+    """Apply the magic rotation to the matrices m."""
+    return matmul(magic_matrix, m)
+
+
+def undo_magic_rotation(m):
+    """Undo the magic rotation of the matrices m."""
+    return matmul(magic_matrix.T, m)
+
+
+def is_twisted(m):
+    """Whether the Hbonds with matrices m are twisted, as in
+    Hbond.is_twisted."""
+    return np.asarray(m)[..., 2, 2] < 0.0
@@ -0,0 +1,45 @@
+# Rscript medfct_test.r foobar/pattern ...
+#
+# Checks that medfctvec keeps the same antipodal points as
+# apply(...,1,medfct), on the points and antipodal points of the
+# rotation files given, random points, and points on box edges and
+# within a rounding error of pi. The exit status is the number of
+# point sets that differ.
+
+source("StartClustSubsetVers4.txt")
+
+check=function(name,x,y,z){
+ old=if (length(x)>0) apply(cbind(x,y,z),1,medfct) else numeric(0)
+ new=medfctvec(x,y,z)
+ same=identical(as.numeric(old),as.numeric(new))
+ cat(name,": ",length(x)," points, ",sum(old==1)," kept, ",
+     if (same) "same" else "DIFFERS","\n",sep="")
+ return(same)
+}
+
+sets=list()
+for (f in commandArgs(TRUE)){
+ rot=matrix(scan(f,quiet=TRUE),,4,byrow=T)
+ a=sqrt(rot[,1]^2+rot[,2]^2+rot[,3]^2)
+ th=rot[,4]
+ x0=rot[,1]/a*th; y0=rot[,2]/a*th; z0=rot[,3]/a*th
+ thpod=pi+(pi-th)
+ xpod=-rot[,1]/a*thpod; ypod=-rot[,2]/a*thpod; zpod=-rot[,3]/a*thpod
+ med=(abs(xpod)<pi)&(abs(ypod)<pi)&(abs(zpod)<pi)
+ sets[[f]]=list(c(x0,xpod[med]),c(y0,ypod[med]),c(z0,zpod[med]))
+}
+set.seed(1)
+sets[["random"]]=list(runif(1e5,-pi,pi),runif(1e5,-pi,pi),runif(1e5,-pi,pi))
+p=pi*(1-.Machine$double.eps/2)  # largest number below pi
+edge=-pi+(0:nb)*delta
+edge=pmin(pmax(c(edge,edge+delta/2,p,-p),-p),p)
+g=expand.grid(edge,edge,c(p,-p,0.01))
+sets[["box edges"]]=list(c(g[,1],g[,3],g[,2]),c(g[,2],g[,1],g[,3]),
+                         c(g[,3],g[,2],g[,1]))
+
+failed=0
+for (name in names(sets)){
+ s=sets[[name]]
+ if (!check(name,s[[1]],s[[2]],s[[3]])) failed=failed+1
+}
+quit(status=failed)